@@ -1,11 +1,39 @@
 # backend.py
-import pandas as pd
-import joblib
+import os
+import numpy as np
+from features import feature_matrix, feature_vector
+from model_artifact import SharedModel
 
-# Load model once
-model = joblib.load("C:/Users/viswa/Desktop/IITI/Digestor Project/penaltyMODEL/data/trained_model.joblib")
+MODEL_PATH = os.environ.get(
+    "BIOGAS_MODEL_PATH", "C:/Users/viswa/Desktop/IITI/Digestor Project/penaltyMODEL/data/trained_model.joblib"
+)
+
+# Loaded once, on first use, so services can point at another artifact before anything is read
+shared_model = None
+
+def load_model(path=None):
+    global shared_model
+    # Flattened trees for low-latency calls (skips pandas and sklearn input validation), memory-mapped
+    # so every worker process shares one copy; a retrained model is picked up without a restart
+    shared_model = SharedModel(path or MODEL_PATH)
+    return shared_model.get()
+
+def get_fast_model():
+    return shared_model.get() if shared_model is not None else load_model()
+
+def release_model():
+    # Drop the mapped tree arrays, e.g. before the artifact is deleted (Windows keeps mapped files locked)
+    global shared_model
+    shared_model = None
 
 def predict_methane_yield(input_dict):
-    df = pd.DataFrame([input_dict])
-    prediction = model.predict(df)[0]
+    ensemble = get_fast_model()
+    prediction = ensemble.predict_one(feature_vector(input_dict, ensemble.feature_names))
     return round(prediction, 4)
+
+def predict_methane_yield_batch(rows):
+    # rows: 2-D array in get_fast_model().feature_names order, or a DataFrame / list of dicts of raw inputs
+    ensemble = get_fast_model()
+    if not isinstance(rows, np.ndarray):
+        rows = feature_matrix(rows, ensemble.feature_names, ensemble.dtype)
+    return ensemble.predict(rows)
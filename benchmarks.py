@@ -0,0 +1,355 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+# Reproducible benchmarks for the hot paths: simulation, sweep, training, prediction, plotting.
+# Every workload uses fixed seeds and synthetic or grid inputs, so two runs on the same machine
+# measure the same work. Results are written as JSON. --baseline compares against a stored run and
+# exits non-zero when a metric got worse by more than --tolerance.
+#
+# Metric names carry their direction: *_s, *_ms and *_us are times (lower is better),
+# *_per_s are throughputs (higher is better); anything else (e.g. nfev) is informational.
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def time_calls(function, repeats, warmup=1):
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+@contextlib.contextmanager
+def quiet():
+    # The sweep and trainer print progress; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# Simulation: one scenario at each corner of the grid, per solver, plus the batched path
+
+def grid_corners():
+    from data_generator import SCENARIO_BOUNDS, SCENARIO_FIELDS
+    low = tuple(SCENARIO_BOUNDS[f][0] for f in SCENARIO_FIELDS)
+    high = tuple(SCENARIO_BOUNDS[f][1] for f in SCENARIO_FIELDS)
+    mid = tuple((a + b) / 2 for a, b in zip(low, high))
+    # Low flow and temperature is the easy corner; high flow, temperature and loading the stiff one
+    return {'easy': low, 'mid': mid, 'stiff': high}
+
+
+def grid_sample(n, seed=42):
+    from data_generator import build_grid
+    grid = build_grid()
+    rng = np.random.default_rng(seed)
+    return [grid[i] for i in np.sort(rng.choice(len(grid), size=min(n, len(grid)), replace=False))]
+
+
+@benchmark("simulation")
+def bench_simulation(config, state):
+    from data_generator import simulate_two_stage_system, simulate_two_stage_batch
+    results = {}
+    for corner, scenario in grid_corners().items():
+        for method in ("LSODA", "BDF"):
+            times = time_calls(lambda: simulate_two_stage_system(*scenario, method=method), config.repeats)
+            result = simulate_two_stage_system(*scenario, method=method)
+            results[f"{corner}_{method}"] = {
+                'median_ms': 1000 * float(np.median(times)),
+                'min_ms': 1000 * float(times.min()),
+                'nfev': int(result.get('nfev', 0)),
+            }
+    scenarios = grid_sample(config.batch_scenarios)
+    times = time_calls(lambda: simulate_two_stage_batch(scenarios), max(1, config.repeats // 2), warmup=0)
+    results['batch'] = {
+        'scenarios': len(scenarios),
+        'per_scenario_ms': 1000 * float(np.median(times)) / len(scenarios),
+        'scenarios_per_s': len(scenarios) / float(np.median(times)),
+    }
+    return results
+
+
+# Sweep: end-to-end scenarios/sec through run_sweep for each worker count
+
+@benchmark("sweep")
+def bench_sweep(config, state):
+    from data_generator import simulate_chunk
+    from dataset_store import PartWriter
+    from sweep_engine import run_sweep
+    scenarios = grid_sample(config.sweep_scenarios)
+    results = {}
+    for workers in config.workers:
+        with tempfile.TemporaryDirectory() as work_dir, quiet():
+            start = time.perf_counter()
+            run_sweep(scenarios, simulate_chunk, work_dir, workers=workers, chunk_size=config.chunk_size,
+                      writer=PartWriter(work_dir, "parquet"))
+            elapsed = time.perf_counter() - start
+        results[f"workers_{workers}"] = {'wall_s': elapsed, 'scenarios_per_s': len(scenarios) / elapsed}
+    return results
+
+
+# Training: fit time of both trainer backends on a seeded synthetic dataset
+
+def synthetic_dataset(n_rows, seed=42):
+    from data_generator import SCENARIO_BOUNDS
+    from features import FEATURE_COLUMNS, derived_features
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({name: rng.uniform(low, high, n_rows) for name, (low, high) in SCENARIO_BOUNDS.items()})
+    df = df.assign(**derived_features(df['FlowRate']))
+    df['VFA'] = rng.gamma(2.0, 0.03, n_rows)
+    df['NH3'] = rng.gamma(2.0, 0.01, n_rows)
+    # Smooth, interacting response so the trees have realistic structure to fit
+    df['CH4_Yield'] = (
+        0.002 * df['SugarIn'] * (1 - df['PalmFrac']) * np.exp(-((df['Temp2'] - 38) / 6) ** 2)
+        * (1 + 0.3 * np.tanh(df['Agitator1_kW'] - 1)) / (1 + 5 * df['VFA']) + rng.normal(0, 1e-4, n_rows)
+    )
+    return df[FEATURE_COLUMNS], df['CH4_Yield']
+
+
+@benchmark("training")
+def bench_training(config, state):
+    from data_trainer import make_model
+    X, y = synthetic_dataset(config.train_rows)
+    results = {'rows': {'count': len(X)}}
+    for backend in ("gbr", "hist"):
+        model = make_model(backend)
+        start = time.perf_counter()
+        model.fit(X, y)
+        results[backend] = {'fit_s': time.perf_counter() - start}
+        if backend == "gbr":
+            state['model'] = model
+    return results
+
+
+# Prediction: backend single-row latency and batch throughput, against plain scikit-learn
+
+@benchmark("prediction")
+def bench_prediction(config, state):
+    import backend
+    X, y = synthetic_dataset(max(config.predict_rows, 2000), seed=7)
+    model = state.get('model')
+    if model is None:
+        from data_trainer import make_model
+        model = make_model("gbr").fit(X.iloc[:5000], y.iloc[:5000])
+
+    rows = X.iloc[:config.predict_calls].to_dict(orient="records")
+    for row in rows:
+        row.pop('OLR'), row.pop('HRT1'), row.pop('HRT2')
+    batch = X.iloc[:config.predict_rows]
+
+    # The backend memory-maps the artifact written here, so everything runs inside the block and
+    # the maps are released before cleanup (Windows cannot delete files that are still mapped)
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        model_path = os.path.join(tmp, "trained_model.joblib")
+        joblib.dump(model, model_path)
+        backend.load_model(model_path)
+        try:
+            latencies = []
+            for row in rows:
+                start = time.perf_counter()
+                backend.predict_methane_yield(row)
+                latencies.append(time.perf_counter() - start)
+            batch_time = float(np.median(time_calls(lambda: backend.predict_methane_yield_batch(batch), 3)))
+        finally:
+            backend.release_model()
+    latencies = np.array(latencies[1:]) * 1e6
+
+    sk_latencies = time_calls(lambda: model.predict(X.iloc[:1]), min(200, config.predict_calls)) * 1e6
+    sk_batch_time = float(np.median(time_calls(lambda: model.predict(batch), 3)))
+    return {
+        'single_row': {
+            'p50_us': float(np.percentile(latencies, 50)),
+            'p99_us': float(np.percentile(latencies, 99)),
+            'sklearn_p50_us': float(np.percentile(sk_latencies, 50)),
+        },
+        'batch': {
+            'rows': len(batch),
+            'rows_per_s': len(batch) / batch_time,
+            'sklearn_rows_per_s': len(batch) / sk_batch_time,
+        },
+    }
+
+
+# Plotting: headless render time of the aggregate figures on a large synthetic dataset
+
+@benchmark("plotting")
+def bench_plotting(config, state):
+    import matplotlib.pyplot as plt
+    import plot_report
+    plt.switch_backend("Agg")
+    rng = np.random.default_rng(0)
+    n = config.plot_rows
+    data = {
+        'OLR': rng.choice([0.75, 1.5, 2.25, 3.0, 3.75, 4.5], n),
+        'Temp2': rng.choice([32.0, 36.0, 40.0, 45.0], n),
+        'CH4_Yield': rng.gamma(2.0, 0.005, n),
+        'Predicted_CH4': rng.gamma(2.0, 0.005, n),
+    }
+    results = {'rows': {'count': n}}
+    for name in ("yield_vs_olr", "actual_vs_predicted", "density_olr"):
+        def render():
+            fig = plot_report.draw(name, data)
+            fig.savefig(io.BytesIO(), format="png", dpi=100)
+            plt.close(fig)
+        results[name] = {'render_s': float(np.median(time_calls(render, 2, warmup=0)))}
+    return results
+
+
+# Running, saving and comparing
+
+def environment():
+    import scipy
+    import sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_benchmarks(config, names=None):
+    state = {}
+    results = {}
+    for name in names or BENCHMARKS:
+        print(f" Running {name} ...", flush=True)
+        start = time.perf_counter()
+        results[name] = BENCHMARKS[name](config, state)
+        print(f"   done in {time.perf_counter() - start:.1f}s")
+    return {'environment': environment(), 'config': vars(config), 'results': results}
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def direction(metric):
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith(("_s", "_ms", "_us")):
+        return -1
+    return 0
+
+
+# Environment fields that change what a run measures; commit and timestamp are expected to differ
+COMPARED_ENVIRONMENT = ('python', 'numpy', 'scipy', 'sklearn', 'platform', 'cpu_count')
+
+
+def differences(current, baseline, section, keys=None):
+    now, before = current.get(section, {}), baseline.get(section, {})
+    keys = keys or sorted(now.keys() | before.keys())
+    return [f"{section}.{key}: baseline {before.get(key)!r}, current {now.get(key)!r}"
+            for key in keys if now.get(key) != before.get(key)]
+
+
+def compare(current, baseline, tolerance=0.10, allow_mismatch=False):
+    # Workload sizes must match (a --quick run against a full baseline is not a regression);
+    # a different machine or library version is only reported, since comparing those is often the point
+    mismatched = differences(current, baseline, 'config')
+    if mismatched and not allow_mismatch:
+        raise ValueError("baseline was run with a different configuration:\n  " + "\n  ".join(mismatched))
+    for line in mismatched + differences(current, baseline, 'environment', COMPARED_ENVIRONMENT):
+        print(f" Warning: {line}")
+
+    now, before = flatten(current['results']), flatten(baseline['results'])
+    rows = []
+    for key in sorted(now.keys() & before.keys()):
+        sign = direction(key)
+        if sign == 0 or not before[key]:
+            continue
+        change = (now[key] - before[key]) / abs(before[key])
+        # Positive "better" means faster or higher throughput
+        better = change * sign
+        status = "regression" if better < -tolerance else "improved" if better > tolerance else "ok"
+        rows.append({'metric': key, 'baseline': before[key], 'current': now[key],
+                     'change_%': 100 * change, 'status': status})
+    return pd.DataFrame(rows, columns=['metric', 'baseline', 'current', 'change_%', 'status'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, training, prediction and plotting hot paths")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None, help="workloads to run (default: all)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write this run's results")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", default=None, metavar="PATH", help="also store this run as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative slowdown reported as a regression")
+    parser.add_argument("--allow-mismatch", action="store_true",
+                        help="compare even if the baseline used a different configuration (e.g. --quick vs full)")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a fast smoke run")
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="sweep worker counts")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    config = argparse.Namespace(
+        quick=args.quick,
+        repeats=args.repeats or (3 if args.quick else 10),
+        batch_scenarios=100 if args.quick else 500,
+        sweep_scenarios=400 if args.quick else 2000,
+        chunk_size=100 if args.quick else 250,
+        workers=args.workers or sorted({1, min(2, cpus), min(4, cpus), cpus}),
+        train_rows=3000 if args.quick else 20_000,
+        predict_rows=10_000 if args.quick else 100_000,
+        predict_calls=500 if args.quick else 5000,
+        plot_rows=200_000 if args.quick else 2_000_000,
+    )
+    report = run_benchmarks(config, args.only)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n Results written to {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f" Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        try:
+            table = compare(report, baseline, args.tolerance, args.allow_mismatch)
+        except ValueError as e:
+            sys.exit(f"\n {e}\n Re-run with the baseline's settings, or pass --allow-mismatch")
+        print("\n" + table.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        regressions = table[table['status'] == "regression"]
+        if len(regressions):
+            print(f"\n {len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
@@ -1,13 +1,77 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import joblib
 import os
+from features import feature_matrix
+from model_artifact import SharedModel
 
 
 model_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\trained_model.joblib"
-model = joblib.load(model_path)
+
+
+# Streamlit reruns this script on every interaction: the model is mapped once per process
+# (shared with every other process using the same artifact, and following retrains), and grid
+# predictions are memoized on the model version and the inputs, so a rerun only redraws
+
+@st.cache_resource
+def load_model(path):
+    return SharedModel(path)
+
+
+# Flattened trees evaluate a whole grid in one vectorized call
+ensemble = load_model(model_path).get()
+feature_names = ensemble.feature_names
+
+# Axes for the response curves and surfaces (same bounds as the input widgets)
+RESPONSE_RANGES = {
+    'FlowRate': (10.0, 300.0),
+    'Temp1': (20.0, 60.0),
+    'Temp2': (20.0, 60.0),
+    'Recycle_Ratio': (0.0, 1.0),
+    'PalmFrac': (0.0, 1.0),
+    'SugarIn': (1.0, 10.0),
+    'VFA': (0.0, 10.0),
+}
+
+# Widget defaults for the optimizer's context inputs. Left at these, the optimizer uses the
+# training-set medians instead: the 0.05 VFA/NH3 defaults are far above anything simulated.
+CONTEXT_DEFAULTS = {'SugarIn': 5.0, 'VFA': 0.05, 'NH3': 0.05}
+
+
+def predict_grid(inputs, axes):
+    # inputs: the operating point; axes: {column: values} swept over a full grid around it
+    mesh = np.meshgrid(*axes.values(), indexing="ij")
+    rows = {name: np.full(mesh[0].size, value, dtype=float) for name, value in inputs.items()}
+    for name, values in zip(axes, mesh):
+        rows[name] = values.ravel()
+    return ensemble.predict(feature_matrix(rows, feature_names, ensemble.dtype)).reshape(mesh[0].shape)
+
+
+@st.cache_data(max_entries=256)
+def response_curves(model_version, inputs, n_points=60):
+    inputs = dict(inputs)
+    curves = {}
+    for name, (low, high) in RESPONSE_RANGES.items():
+        x = np.linspace(low, high, n_points)
+        curves[name] = pd.DataFrame({name: x, 'CH4_Yield': predict_grid(inputs, {name: x})}).set_index(name)
+    return curves
+
+
+@st.cache_data(max_entries=64)
+def response_surface(model_version, inputs, x_name, y_name, n_points=40):
+    x = np.linspace(*RESPONSE_RANGES[x_name], n_points)
+    y = np.linspace(*RESPONSE_RANGES[y_name], n_points)
+    return x, y, predict_grid(dict(inputs), {x_name: x, y_name: y})
+
+
+@st.cache_data(max_entries=32)
+def best_operating_points(model_version, max_agitator_kw, context):
+    # Imported here: only the roles that optimize pay for loading the simulator module.
+    # context holds only the inputs the user changed; the rest come from the dataset medians.
+    from optimizer import optimize_operating_point
+    return optimize_operating_point(
+        ensemble, context=dict(context), max_agitator_kw=max_agitator_kw, top=5, data_dir=os.path.dirname(model_path)
+    )
 
 
 # UI: Role selection
@@ -31,24 +95,14 @@ with st.form("input_form"):
         agitator2 = st.number_input("Agitator 2 Power (kW)", min_value=0.0, max_value=5.0, value=1.5)
         recycle_ratio = st.slider("Slurry Recycle Ratio (0–1)", 0.0, 1.0, 0.2)
         palm_frac = st.slider("Palm Oil Co-substrate Fraction (0–1)", 0.0, 1.0, 0.25)
-        sugar_in = st.number_input("Sugar input (gCOD/L)", min_value=1.0, max_value=10.0, value=5.0)
+        sugar_in = st.number_input("Sugar input (gCOD/L)", min_value=1.0, max_value=10.0, value=CONTEXT_DEFAULTS['SugarIn'])
     with col3:
-        vfa = st.number_input("VFA (gCOD/L)", min_value=0.0, max_value=10.0, value=0.05)
-        nh3 = st.number_input("NH3 (g N/L)", min_value=0.0, max_value=5.0, value=0.05)
+        vfa = st.number_input("VFA (gCOD/L)", min_value=0.0, max_value=10.0, value=CONTEXT_DEFAULTS['VFA'])
+        nh3 = st.number_input("NH3 (g N/L)", min_value=0.0, max_value=5.0, value=CONTEXT_DEFAULTS['NH3'])
         biogas_flow = st.number_input("Biogas Flow (Nm³/h)", min_value=0.0, max_value=50.0, value=0.0)
     submitted = st.form_submit_button("Predict Methane Yield")
 
-# Derived Inputs
-
-VS_in = 25.0
-V1 = 300
-V2 = 700
-total_V = V1 + V2
-olr = (flow * VS_in) / total_V
-hrt1 = V1 / flow
-hrt2 = V2 / flow
-
-# Preparing the input Data Frame with all required columns
+# Preparing the raw inputs; OLR/HRT1/HRT2 are derived in features.py
 input_dict = {
     'FlowRate': flow,
     'Temp1': temp1,
@@ -58,24 +112,19 @@ input_dict = {
     'Recycle_Ratio': recycle_ratio,
     'PalmFrac': palm_frac,
     'SugarIn': sugar_in,
-    'OLR': olr,
-    'HRT1': hrt1,
-    'HRT2': hrt2,
     'VFA': vfa,
     'NH3': nh3,
-    'CH4_Yield': 0,  # this is a placeholder value, not used for prediction
     'Biogas_Flow': biogas_flow
 }
-input_df = pd.DataFrame([input_dict])
 
 
 # Prediction and Display
 
 if submitted:
-    # Aligning input_df columns with model's expected features
-    if hasattr(model, 'feature_names_in_'):
-        input_df = input_df.reindex(columns=model.feature_names_in_, fill_value=0)
-    prediction = model.predict(input_df)[0]
+    # Derived features + columns validated and ordered against the model's schema
+    prediction = ensemble.predict(feature_matrix(input_dict, feature_names, ensemble.dtype))[0]
+    # Hashable key for the memoized grids: they are recomputed only when an input changes
+    point = tuple(sorted(input_dict.items()))
     st.success(f"✅ Predicted Methane Yield: {round(prediction, 4)} L CH₄ / L reactor volume")
 
     # Optional role-based extras (STILL A WORK IN PROGRESS
@@ -83,19 +132,46 @@ if submitted:
         st.metric("Methane Yield (L CH₄/L)", round(prediction, 4))
     elif role == "Engineer":
         st.metric("Methane Yield (L CH₄/L)", round(prediction, 4))
-        st.subheader("Engineer View: Input vs Yield")
-        fig, ax = plt.subplots()
-        sns.scatterplot(x=[flow], y=[prediction], ax=ax)
-        ax.set_xlabel("Flowrate")
-        ax.set_ylabel("Methane Yield")
-        ax.set_title("Flowrate vs Methane Yield")
-        st.pyplot(fig)
+        st.subheader("Engineer View: Yield response around the current operating point")
+        curves = response_curves(ensemble.version, point)
+        columns = st.columns(3)
+        for i, (name, curve) in enumerate(curves.items()):
+            with columns[i % 3]:
+                st.caption(f"{name} vs Methane Yield")
+                st.line_chart(curve, height=200)
     elif role == "Manager":
         st.metric("Methane Yield (L CH₄/L)", round(prediction, 4))
         st.info("Manager: High Recycle Ratios or VFA can reduce yield.")
         st.write("⚠️ Check recycle ratio or VFA concentration if yield is low.")
+        # matplotlib is only imported by the one view that draws with it
+        import matplotlib.pyplot as plt
+        x, y, z = response_surface(ensemble.version, point, 'Recycle_Ratio', 'VFA')
+        fig, ax = plt.subplots()
+        contour = ax.contourf(x, y, z.T, levels=20, cmap="viridis")
+        ax.plot(recycle_ratio, vfa, "r*", markersize=12)
+        fig.colorbar(contour, ax=ax, label="Methane Yield (L CH₄/L)")
+        ax.set_xlabel("Recycle Ratio")
+        ax.set_ylabel("VFA (gCOD/L)")
+        ax.set_title("Recycle Ratio × VFA yield surface")
+        st.pyplot(fig)
+        plt.close(fig)
     elif role == "Executive":
         st.metric("Methane Yield (L CH₄/L)", round(prediction, 4))
         st.caption("📊 Summary: Predicted CH₄ yield based on current plant settings.")
 
 
+# Operating-point optimizer: searches the model for the best settings at the current feed and VFA/NH3,
+# taking the training-set medians for any of those the user has not changed
+
+if role in ("Engineer", "Manager"):
+    with st.expander("Optimize operating point"):
+        budget = st.number_input("Agitator power budget (kW, both stages)", min_value=0.5, max_value=10.0, value=3.0)
+        if st.button("Find best settings"):
+            entered = {'SugarIn': sugar_in, 'VFA': vfa, 'NH3': nh3}
+            context = tuple((name, value) for name, value in entered.items() if value != CONTEXT_DEFAULTS[name])
+            best = best_operating_points(ensemble.version, budget, context)
+            st.caption(f"{best.attrs['evaluations']} candidates evaluated over {best.attrs['generations']} generations")
+            defaulted = [name for name in entered if name not in dict(context)]
+            if defaulted:
+                st.caption(f"{', '.join(defaulted)} held at the training-set medians (change the inputs above to override)")
+            st.dataframe(best.drop(columns=['Score', 'Violation']), use_container_width=True)
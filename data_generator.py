@@ -1,15 +1,19 @@
 import numpy as np
 import pandas as pd
 from scipy.integrate import solve_ivp
+from scipy.optimize import root
+from scipy.sparse import bsr_matrix
 import os
+import time
+from features import V_stage1, V_stage2, INPUT_COLUMNS, derived_features
 
-# Constants
-V_stage1 = 300  # L
-V_stage2 = 700  # L
-VS_in = 25.0    # gVS/L
+# Constants (plant volumes and VS_in live in features.py)
 R = 8.314
 T_ref = 308.15  # 35°C in K
 
+# Bump whenever the model equations change, so cached results from the old model are not reused
+MODEL_VERSION = "adm1-two-stage-1"
+
 # Parameters
 params = {
     'k_hyd': 1.0, 'K_hyd': 0.3, 'Ea_hyd': 60000, 'b_hyd': 0.05,
@@ -79,43 +83,498 @@ def adm1_stage(t, state, params, Q_in, S_su_in, V_reactor, T, agitator_kw, recyc
     return [dS_su, dX_hyd, dS_aa, dX_aco, dS_ac, dX_ace, dS_ch4, dS_vfa, dS_nh3, dX_meth]
 
 # Taking 2-stage AD system into consideration for simulations
-def simulate_two_stage_system(Q_in, T1_C, T2_C, agitator1_kw, agitator2_kw, recycle_ratio, palm_frac, S_su_in, hours=30):
-    t_span = (0, hours)
-    t_eval = np.linspace(*t_span, 300)
+STIFF_METHODS = ("LSODA", "BDF", "Radau")
+SIM_MODES = ("dynamic", "steady_state")
+
+# S_ch4 only accumulates (no washout term), so the CSTR operating point is defined on the other 9 states
+SS_STATES = [0, 1, 2, 3, 4, 5, 7, 8, 9]
+
+def integrate_stage(state0, args, hours, method, jac, points=None):
+    # Only the final state is used, so ask the solver for that point alone. With points, the
+    # solver also reports that many evenly spaced states, returned as a (10, points) trajectory
+    # in place of the final state; the steps it takes are the same either way.
+    t_eval = [hours] if points is None else np.linspace(0, hours, points)
+    res = solve_ivp(
+        adm1_stage, (0, hours), state0, args=args,
+        t_eval=t_eval, method=method, rtol=1e-5, atol=1e-6, jac=jac
+    )
+    if not res.success:
+        raise RuntimeError(res.message)
+    y = np.clip(res.y, 0, np.inf)
+    return (y[:, -1] if points is None else y), res.nfev, res.njev, res.nlu
+
+def steady_state_stage(guess, args, tol=1e-8):
+    # Newton-type root solve of adm1_stage = 0 on the non-accumulating states.
+    # Returns None unless the root is non-negative and locally stable, which rules out
+    # washout solutions the reactor would never settle on.
+    state = np.array(guess, dtype=float)
+
+    def residual(x):
+        state[SS_STATES] = x
+        return np.asarray(adm1_stage(0, state, *args))[SS_STATES]
+
+    def jacobian(x):
+        state[SS_STATES] = x
+        return adm1_jacobian(0, state, *args)[np.ix_(SS_STATES, SS_STATES)]
+
+    sol = root(residual, state[SS_STATES], jac=jacobian, method="hybr", options={'xtol': 1e-10})
+    if not sol.success or np.max(np.abs(residual(sol.x))) > tol or np.min(sol.x) < -1e-9:
+        return None
+    if np.max(np.linalg.eigvals(jacobian(sol.x)).real) > 1e-9:
+        return None
+    state[SS_STATES] = np.clip(sol.x, 0, np.inf)
+    # hybr factorizes every Jacobian it evaluates, so nlu == njev
+    njev = sol.get('njev', 0)
+    return state, sol.nfev, njev, njev
+
+def operating_point_guess(state0, args):
+    # Closed-form operating point with hydrolysers washed out and every other population
+    # at its break-even substrate level (mu = b); Newton then polishes or rejects it
+    params, Q_in, S_su_in, V_reactor, T, agitator_kw, recycle_ratio = args
+    k = stage_rate_constants(params, [T], [agitator_kw], V_reactor)
+    return operating_point_guess_batch(np.asarray(state0, dtype=float)[None], params, k,
+                                       np.array([Q_in / V_reactor]), np.array([S_su_in]))[0]
+
+def solve_stage(state0, args, hours, method, jac, mode):
+    if mode == "dynamic":
+        return integrate_stage(state0, args, hours, method, jac)
+
+    # Newton from the closed-form guess first; if that misses, integrate over the horizon
+    # and retry from there; if that misses too, fall back to the time-integrated result
+    nfev = njev = nlu = 0
+    guess = operating_point_guess(state0, args)
+    for attempt in range(2):
+        found = steady_state_stage(guess, args)
+        if found is not None:
+            ss, f, j, lu = found
+            # Methane produced at the operating point over the horizon
+            rates = np.asarray(adm1_stage(0, ss, *args))
+            ss[6] = state0[6] + rates[6] * hours
+            return ss, nfev + f, njev + j, nlu + lu
+        if attempt == 0:
+            guess, f, j, lu = integrate_stage(state0, args, hours, method, jac)
+            nfev, njev, nlu = nfev + f, njev + j, nlu + lu
+    return guess, nfev, njev, nlu
+
+def initial_state(sugar_adj):
+    # Fresh digester: feed sugar plus small seed populations
+    return [sugar_adj, 0.02, 0.05, 0.01, 0.1, 0.005, 0.0, 0.03, 0.03, 0.005]
+
+def simulate_two_stage_system(Q_in, T1_C, T2_C, agitator1_kw, agitator2_kw, recycle_ratio, palm_frac, S_su_in, hours=30,
+                              method="LSODA", analytic_jac=True, mode="dynamic", trajectory_points=None):
+    """Simulate both stages for one scenario.
+
+    mode="dynamic" integrates each stage for `hours`. mode="steady_state" solves for each
+    stage's CSTR operating point directly and reports the methane accumulated at that
+    point over `hours`, falling back to time integration when the root solve fails.
+    trajectory_points (dynamic mode only) adds a float32 (2, 10, points) 'trajectory' to the result.
+    """
+    if method not in STIFF_METHODS:
+        raise ValueError(f"method must be one of {STIFF_METHODS}, got {method!r}")
+    if mode not in SIM_MODES:
+        raise ValueError(f"mode must be one of {SIM_MODES}, got {mode!r}")
+    if trajectory_points and mode != "dynamic":
+        raise ValueError("trajectories are only captured in dynamic mode")
     T1 = T1_C + 273.15
     T2 = T2_C + 273.15
     sugar_adj = S_su_in * (1 - palm_frac)
+    jac = adm1_jacobian if analytic_jac else None
+
+    init_state = initial_state(sugar_adj)
+    start = time.perf_counter()
 
-    init_state = [sugar_adj, 0.02, 0.05, 0.01, 0.1, 0.005, 0.0, 0.03, 0.03, 0.005]
+    def run_stage(state0, args):
+        if trajectory_points:
+            y, nfev, njev, nlu = integrate_stage(state0, args, hours, method, jac, trajectory_points)
+            trajectories.append(y)
+            return y[:, -1], nfev, njev, nlu
+        return solve_stage(state0, args, hours, method, jac, mode)
 
+    trajectories = []
     try:
-        res1 = solve_ivp(
-            adm1_stage, t_span, init_state, args=(params, Q_in, sugar_adj, V_stage1, T1, agitator1_kw, recycle_ratio),
-            t_eval=t_eval, method="LSODA", rtol=1e-5, atol=1e-6
+        outlet_stage1, nfev1, njev1, nlu1 = run_stage(
+            init_state, (params, Q_in, sugar_adj, V_stage1, T1, agitator1_kw, recycle_ratio)
         )
-        outlet_stage1 = np.clip(res1.y[:, -1], 0, np.inf)
     except Exception as e:
-        return {'CH4_Yield': np.nan}
+        return {'CH4_Yield': np.nan, 'error': f"stage 1: {type(e).__name__}: {e}", 'wall_s': time.perf_counter() - start}
 
     try:
-        res2 = solve_ivp(
-            adm1_stage, t_span, outlet_stage1, args=(params, Q_in, outlet_stage1[0], V_stage2, T2, agitator2_kw, recycle_ratio),
-            t_eval=t_eval, method="LSODA", rtol=1e-5, atol=1e-6
+        outlet_stage2, nfev2, njev2, nlu2 = run_stage(
+            outlet_stage1, (params, Q_in, outlet_stage1[0], V_stage2, T2, agitator2_kw, recycle_ratio)
         )
-        outlet_stage2 = np.clip(res2.y[:, -1], 0, np.inf)
     except Exception as e:
-        return {'CH4_Yield': np.nan}
+        return {'CH4_Yield': np.nan, 'error': f"stage 2: {type(e).__name__}: {e}", 'wall_s': time.perf_counter() - start}
 
     ch4 = outlet_stage2[6]
     biogas = ch4 * (Q_in / 1000) * 0.65 / (hours / 24)
+    extra = {'trajectory': np.stack(trajectories).astype(np.float32)} if trajectory_points else {}
 
     return {
         'CH4_Yield': ch4,
         'Biogas_Flow': biogas,
         'Final_VFA': outlet_stage2[7],
-        'Final_NH3': outlet_stage2[8]
+        'Final_NH3': outlet_stage2[8],
+        'nfev': nfev1 + nfev2,
+        'njev': njev1 + njev2,
+        'nlu': nlu1 + nlu2,
+        'wall_s': time.perf_counter() - start,
+        **extra
     }
 
+# Batched ADM1: N scenarios stacked into an N x 10 state array
+def stage_rate_constants(params, T, agitator_kw, V_reactor):
+    # Temperature- and mixing-dependent rate constants, worked out once per scenario
+    T = np.asarray(T, dtype=float)
+    scale = mixing_efficiency(np.asarray(agitator_kw, dtype=float), V_reactor) * temperature_penalty(T)
+    return np.stack([
+        arrhenius(params['k_hyd'], params['Ea_hyd'], T) * scale,
+        arrhenius(params['k_aco'], params['Ea_aco'], T) * scale,
+        arrhenius(params['k_ace'], params['Ea_ace'], T) * scale,
+        arrhenius(params['k_meth'], params['Ea_meth'], T) * scale,
+    ], axis=1)
+
+def adm1_stage_batch(t, y, params, k, dilution, S_su_in):
+    S_su, X_hyd, S_aa, X_aco, S_ac, X_ace, S_ch4, S_vfa, S_nh3, X_meth = y.reshape(-1, 10).T
+    k_hyd, k_aco, k_ace, k_meth = k.T
+
+    nh3_pen = nh3_penalty(S_nh3)
+
+    mu_hyd = (k_hyd * S_su) / (params['K_hyd'] + S_su + 1e-6)
+    mu_aco = (k_aco * S_su) / (params['K_aco'] + S_su + 1e-6)
+    mu_ace = (k_ace * S_aa) / (params['K_ace'] + S_aa + 1e-6)
+    mu_meth = (k_meth * S_ac) / (params['K_meth'] + S_ac + 1e-6)
+
+    inh_vfa = 1 / (1 + (S_vfa / params['KI_vfa'])**2)
+    inh_nh3 = 1 / (1 + (S_nh3 / params['KI_nh3'])**2)
+    mu_meth = mu_meth * inh_vfa * inh_nh3 * nh3_pen
+
+    r_hyd = mu_hyd * X_hyd
+    r_aco = mu_aco * X_aco
+    r_ace = mu_ace * X_ace
+    r_meth = mu_meth * X_meth
+
+    r_su_used = r_aco / params['Y_aco']
+    r_aa_used = r_ace / params['Y_ace']
+    r_ac_used = r_meth / params['Y_meth']
+
+    dy = np.empty((len(S_su), 10))
+    dy[:, 0] = -r_su_used + r_hyd + dilution*(S_su_in - S_su)
+    dy[:, 1] = r_hyd - params['b_hyd'] * X_hyd
+    dy[:, 2] = -r_aa_used + r_aco - dilution*S_aa
+    dy[:, 3] = r_aco - params['b_aco'] * X_aco
+    dy[:, 4] = -r_ac_used + r_ace - dilution*S_ac
+    dy[:, 5] = r_ace - params['b_ace'] * X_ace
+    dy[:, 6] = r_meth * 0.35
+    dy[:, 7] = r_aco * 0.5 - r_ace * 0.3 - dilution*S_vfa
+    dy[:, 8] = r_aco * 0.2 - dilution*S_nh3
+    dy[:, 9] = r_meth - params['b_meth'] * X_meth
+    return dy.ravel()
+
+# Analytical Jacobian of the ADM1 RHS, returned as one 10 x 10 block per scenario
+def adm1_jacobian_blocks(state, params, k, dilution):
+    S_su, X_hyd, S_aa, X_aco, S_ac, X_ace, S_ch4, S_vfa, S_nh3, X_meth = np.asarray(state).reshape(-1, 10).T
+    k_hyd, k_aco, k_ace, k_meth = np.asarray(k).reshape(-1, 4).T
+
+    # Monod terms and their derivatives w.r.t. the substrate
+    den_hyd = params['K_hyd'] + S_su + 1e-6
+    den_aco = params['K_aco'] + S_su + 1e-6
+    den_ace = params['K_ace'] + S_aa + 1e-6
+    den_meth = params['K_meth'] + S_ac + 1e-6
+    mu_hyd = k_hyd * S_su / den_hyd
+    mu_aco = k_aco * S_su / den_aco
+    mu_ace = k_ace * S_aa / den_ace
+    mu_meth0 = k_meth * S_ac / den_meth
+    dmu_hyd = k_hyd * (den_hyd - S_su) / den_hyd**2
+    dmu_aco = k_aco * (den_aco - S_su) / den_aco**2
+    dmu_ace = k_ace * (den_ace - S_aa) / den_ace**2
+    dmu_meth0 = k_meth * (den_meth - S_ac) / den_meth**2
+
+    # Inhibition factors on methanogenesis: VFA, NH3 and the extra NH3 penalty
+    inh_vfa = 1 / (1 + (S_vfa / params['KI_vfa'])**2)
+    inh_nh3 = 1 / (1 + (S_nh3 / params['KI_nh3'])**2)
+    nh3_pen = nh3_penalty(S_nh3)
+    dinh_vfa = -2 * S_vfa / params['KI_vfa']**2 * inh_vfa**2
+    dinh_nh3 = -2 * S_nh3 / params['KI_nh3']**2 * inh_nh3**2
+    dnh3_pen = -2 * S_nh3 / 0.5**2 * nh3_pen**2
+    inh = inh_vfa * inh_nh3 * nh3_pen
+    mu_meth = mu_meth0 * inh
+
+    # Partial derivatives of the reaction rates
+    dr_hyd_dSsu = dmu_hyd * X_hyd
+    dr_aco_dSsu = dmu_aco * X_aco
+    dr_ace_dSaa = dmu_ace * X_ace
+    dr_meth_dSac = dmu_meth0 * inh * X_meth
+    dr_meth_dSvfa = mu_meth0 * dinh_vfa * inh_nh3 * nh3_pen * X_meth
+    dr_meth_dSnh3 = mu_meth0 * inh_vfa * (dinh_nh3 * nh3_pen + inh_nh3 * dnh3_pen) * X_meth
+
+    Y_aco, Y_ace, Y_meth = params['Y_aco'], params['Y_ace'], params['Y_meth']
+    J = np.zeros((len(S_su), 10, 10))
+
+    J[:, 0, 0] = -dr_aco_dSsu / Y_aco + dr_hyd_dSsu - dilution
+    J[:, 0, 1] = mu_hyd
+    J[:, 0, 3] = -mu_aco / Y_aco
+
+    J[:, 1, 0] = dr_hyd_dSsu
+    J[:, 1, 1] = mu_hyd - params['b_hyd']
+
+    J[:, 2, 0] = dr_aco_dSsu
+    J[:, 2, 2] = -dr_ace_dSaa / Y_ace - dilution
+    J[:, 2, 3] = mu_aco
+    J[:, 2, 5] = -mu_ace / Y_ace
+
+    J[:, 3, 0] = dr_aco_dSsu
+    J[:, 3, 3] = mu_aco - params['b_aco']
+
+    J[:, 4, 2] = dr_ace_dSaa
+    J[:, 4, 4] = -dr_meth_dSac / Y_meth - dilution
+    J[:, 4, 5] = mu_ace
+    J[:, 4, 7] = -dr_meth_dSvfa / Y_meth
+    J[:, 4, 8] = -dr_meth_dSnh3 / Y_meth
+    J[:, 4, 9] = -mu_meth / Y_meth
+
+    J[:, 5, 2] = dr_ace_dSaa
+    J[:, 5, 5] = mu_ace - params['b_ace']
+
+    J[:, 6, 4] = 0.35 * dr_meth_dSac
+    J[:, 6, 7] = 0.35 * dr_meth_dSvfa
+    J[:, 6, 8] = 0.35 * dr_meth_dSnh3
+    J[:, 6, 9] = 0.35 * mu_meth
+
+    J[:, 7, 0] = 0.5 * dr_aco_dSsu
+    J[:, 7, 2] = -0.3 * dr_ace_dSaa
+    J[:, 7, 3] = 0.5 * mu_aco
+    J[:, 7, 5] = -0.3 * mu_ace
+    J[:, 7, 7] = -dilution
+
+    J[:, 8, 0] = 0.2 * dr_aco_dSsu
+    J[:, 8, 3] = 0.2 * mu_aco
+    J[:, 8, 8] = -dilution
+
+    J[:, 9, 4] = dr_meth_dSac
+    J[:, 9, 7] = dr_meth_dSvfa
+    J[:, 9, 8] = dr_meth_dSnh3
+    J[:, 9, 9] = mu_meth - params['b_meth']
+    return J
+
+def adm1_jacobian(t, state, params, Q_in, S_su_in, V_reactor, T, agitator_kw, recycle_ratio):
+    # Same signature as adm1_stage so it can be handed to solve_ivp with the same args
+    k = stage_rate_constants(params, [T], [agitator_kw], V_reactor)
+    return adm1_jacobian_blocks(state, params, k, Q_in / V_reactor)[0]
+
+def block_jacobian_batch(t, y, params, k, dilution, S_su_in):
+    # Scenarios are independent, so the batched Jacobian is block diagonal
+    blocks = adm1_jacobian_blocks(y, params, k, dilution)
+    n = len(blocks)
+    return bsr_matrix((blocks, np.arange(n), np.arange(n + 1)), shape=(10 * n, 10 * n)).tocsc()
+
+BATCH_SOLVER = {'method': 'BDF', 'rtol': 1e-5, 'atol': 1e-6}
+# LSODA only takes a dense Jacobian, which would be (10N)^2 for a batch
+BATCH_METHODS = ("BDF", "Radau")
+
+def batch_solver_settings(method=None):
+    solver = dict(BATCH_SOLVER, method=method or BATCH_SOLVER['method'])
+    if solver['method'] not in BATCH_METHODS:
+        raise ValueError(f"batched solves support {BATCH_METHODS}, got {solver['method']!r}")
+    return solver
+
+def solve_stage_batch(state0, k, dilution, S_su_in, hours, method=None, points=None):
+    # With points, also returns the evenly spaced states as an (N, 10, points) array
+    n = len(state0)
+    res = solve_ivp(
+        adm1_stage_batch, (0, hours), np.asarray(state0, dtype=float).ravel(),
+        args=(params, k, dilution, S_su_in), t_eval=[hours] if points is None else np.linspace(0, hours, points),
+        jac=block_jacobian_batch, **batch_solver_settings(method)
+    )
+    if not res.success:
+        raise RuntimeError(res.message)
+    y = np.clip(res.y, 0, np.inf).reshape(n, 10, -1)
+    return y[:, :, -1], res, (y if points is not None else None)
+
+# Stage dependency graph. Stage 1 only sees (Q_in, T1, agitator1, palm-adjusted sugar);
+# stage 2 adds (T2, agitator2) on top of the stage-1 outlet. recycle_ratio is passed to
+# adm1_stage but never enters the RHS, so scenarios differing only in it share one solve.
+def stage_plan(scenarios):
+    Q_in, T1_C, T2_C, A1, A2, RR, PF, S_su_in = np.asarray(scenarios, dtype=float).T
+    sugar_adj = S_su_in * (1 - PF)
+    stage1_keys, stage1_of = np.unique(np.column_stack([Q_in, T1_C, A1, sugar_adj]), axis=0, return_inverse=True)
+    stage2_keys, stage2_of = np.unique(np.column_stack([stage1_of.ravel(), T2_C, A2]), axis=0, return_inverse=True)
+    return stage1_keys, stage2_keys, stage2_of.ravel()
+
+# Batched operating points: the closed-form guess and Newton's method over all problems at once
+
+def operating_point_guess_batch(state0, params, k, dilution, S_su_in):
+    # Vectorized operating_point_guess: one row per problem
+    k_hyd, k_aco, k_ace, k_meth = k.T
+    D = dilution
+
+    def break_even(k, K, b):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(k > b, b * (K + 1e-6) / (k - b), np.inf)
+
+    S_su = np.minimum(break_even(k_aco, params['K_aco'], params['b_aco']), S_su_in)
+    r_aco = params['Y_aco'] * D * (S_su_in - S_su)
+    S_aa = break_even(k_ace, params['K_ace'], params['b_ace'])
+    r_ace = np.maximum(params['Y_ace'] * (r_aco - D * S_aa), 0.0)
+    S_aa = np.minimum(S_aa, r_aco / D)
+    S_vfa = (0.5 * r_aco - 0.3 * r_ace) / D
+    S_nh3 = 0.2 * r_aco / D
+    inh = 1 / (1 + (S_vfa / params['KI_vfa'])**2) / (1 + (S_nh3 / params['KI_nh3'])**2) * nh3_penalty(S_nh3)
+    S_ac = break_even(k_meth * inh, params['K_meth'], params['b_meth'])
+    r_meth = np.maximum(params['Y_meth'] * (r_ace - D * S_ac), 0.0)
+    S_ac = np.minimum(S_ac, r_ace / D)
+
+    guess = np.column_stack([S_su, np.zeros_like(S_su), S_aa, r_aco / params['b_aco'], S_ac, r_ace / params['b_ace'],
+                             state0[:, 6], S_vfa, S_nh3, r_meth / params['b_meth']])
+    return np.clip(guess, 0, np.inf)
+
+def newton_batch(guess, k, dilution, S_su_in, tol=1e-8, max_iter=50, max_halvings=12):
+    # Damped Newton on adm1_stage_batch = 0 over SS_STATES. Each iteration is one batched RHS,
+    # one set of 9 x 9 blocks of the block-diagonal Jacobian and one stacked solve; problems drop
+    # out as they converge. Same acceptance as steady_state_stage: non-negative and locally stable.
+    y = np.array(guess, dtype=float)
+    n = len(y)
+    nfev = np.zeros(n, dtype=int)
+    njev = np.zeros(n, dtype=int)
+
+    def residual(rows, states):
+        nfev[rows] += 1
+        return adm1_stage_batch(0, states, params, k[rows], dilution[rows], S_su_in[rows]).reshape(-1, 10)[:, SS_STATES]
+
+    def jacobian(rows, states):
+        return adm1_jacobian_blocks(states, params, k[rows], dilution[rows])[:, SS_STATES][:, :, SS_STATES]
+
+    f = residual(np.arange(n), y)
+    norm = np.linalg.norm(f, axis=1)
+    stalled = np.zeros(n, dtype=bool)
+    for _ in range(max_iter):
+        active = np.flatnonzero((np.abs(f).max(axis=1) > tol) & ~stalled)
+        if not len(active):
+            break
+        J = jacobian(active, y[active])
+        njev[active] += 1
+        try:
+            step = np.linalg.solve(J, -f[active][..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step = (np.linalg.pinv(J) @ -f[active][..., None])[..., 0]
+
+        # Backtracking: halve each problem's step until its residual norm goes down
+        alpha = np.ones(len(active))
+        pending = np.arange(len(active))
+        for _ in range(max_halvings):
+            rows = active[pending]
+            trial = y[rows]
+            trial[:, SS_STATES] += alpha[pending, None] * step[pending]
+            f_trial = residual(rows, trial)
+            norm_trial = np.linalg.norm(f_trial, axis=1)
+            ok = norm_trial < norm[rows]
+            y[rows[ok]], f[rows[ok]], norm[rows[ok]] = trial[ok], f_trial[ok], norm_trial[ok]
+            pending = pending[~ok]
+            if not len(pending):
+                break
+            alpha[pending] /= 2
+        stalled[active[pending]] = True
+
+    found = (np.abs(f).max(axis=1) <= tol) & (y[:, SS_STATES].min(axis=1) >= -1e-9)
+    if found.any():
+        rows = np.flatnonzero(found)
+        stable = np.linalg.eigvals(jacobian(rows, y[rows])).real.max(axis=1) <= 1e-9
+        found[rows[~stable]] = False
+    y[:, SS_STATES] = np.where(found[:, None], np.clip(y[:, SS_STATES], 0, np.inf), y[:, SS_STATES])
+    return y, found, nfev, njev
+
+def steady_state_stage_batch(state0, k, dilution, S_su_in, hours, method=None):
+    # Batched solve_stage(mode="steady_state"): Newton from the closed-form guesses; problems it
+    # misses are integrated over the horizon (one batched solve) and retried from there, and keep
+    # the time-integrated result if they miss again. Returns the states and (N, 3) nfev/njev/nlu.
+    state0 = np.asarray(state0, dtype=float)
+    guess = operating_point_guess_batch(state0, params, k, dilution, S_su_in)
+    y, found, nfev, njev = newton_batch(guess, k, dilution, S_su_in)
+    cost = np.column_stack([nfev, njev, njev])
+
+    retry = np.flatnonzero(~found)
+    if len(retry):
+        integrated, res, _ = solve_stage_batch(state0[retry], k[retry], dilution[retry], S_su_in[retry], hours, method)
+        y_retry, found_retry, nfev, njev = newton_batch(integrated, k[retry], dilution[retry], S_su_in[retry])
+        y[retry] = np.where(found_retry[:, None], y_retry, integrated)
+        found[retry] = found_retry
+        # The integration is shared by the retried problems, as in the batched dynamic path
+        cost[retry] += np.column_stack([nfev + res.nfev, njev + res.njev, njev + res.nlu])
+
+    # Methane produced at the operating point over the horizon
+    rates = adm1_stage_batch(0, y, params, k, dilution, S_su_in).reshape(-1, 10)
+    y[found, 6] = state0[found, 6] + rates[found, 6] * hours
+    return y, cost
+
+def steady_state_batch(Q1, T1_C, A1, sugar_adj, stage1_of, T2_C, A2, hours, method):
+    # Operating points for every distinct stage-1 problem, then every stage-2 problem, each in one batch
+    init_state = np.array([initial_state(s) for s in sugar_adj])
+    k1 = stage_rate_constants(params, T1_C + 273.15, A1, V_stage1)
+    outlet_stage1, cost1 = steady_state_stage_batch(init_state, k1, Q1 / V_stage1, sugar_adj, hours, method)
+    outlet_stage1 = outlet_stage1[stage1_of]
+    k2 = stage_rate_constants(params, T2_C + 273.15, A2, V_stage2)
+    outlet_stage2, cost2 = steady_state_stage_batch(outlet_stage1, k2, Q1[stage1_of] / V_stage2, outlet_stage1[:, 0],
+                                                    hours, method)
+    return outlet_stage2, cost1[stage1_of] + cost2
+
+def simulate_two_stage_batch(scenarios, hours=30, method=None, mode="dynamic", trajectory_points=None):
+    """Batched simulate_two_stage_system: one solver call per stage for all scenarios.
+
+    scenarios is a sequence of (Q_in, T1_C, T2_C, agitator1_kw, agitator2_kw,
+    recycle_ratio, palm_frac, S_su_in) tuples; returns one result dict per scenario.
+    Each distinct stage-1 problem is solved once and fanned out to its stage-2 cases.
+    nfev/njev/nlu count the shared batch solver calls each scenario was part of, and wall_s
+    is the batch's wall time split evenly over its scenarios.
+    mode="steady_state" solves operating points as in simulate_two_stage_system.
+    trajectory_points adds each scenario's float32 (2, 10, points) 'trajectory', as there.
+    """
+    if mode not in SIM_MODES:
+        raise ValueError(f"mode must be one of {SIM_MODES}, got {mode!r}")
+    if trajectory_points and mode != "dynamic":
+        raise ValueError("trajectories are only captured in dynamic mode")
+    if len(scenarios) == 0:
+        return []
+    stage1_keys, stage2_keys, stage2_of = stage_plan(scenarios)
+    Q1, T1_C, A1, sugar_adj = stage1_keys.T
+    stage1_of = stage2_keys[:, 0].astype(int)
+    T2_C, A2 = stage2_keys[:, 1], stage2_keys[:, 2]
+    Q2 = Q1[stage1_of]
+
+    init_state = np.array([initial_state(s) for s in sugar_adj])
+    start = time.perf_counter()
+
+    try:
+        if mode == "steady_state":
+            outlet_stage2, cost = steady_state_batch(
+                Q1, T1_C, A1, sugar_adj, stage1_of, T2_C, A2, hours, batch_solver_settings(method)['method']
+            )
+        else:
+            k1 = stage_rate_constants(params, T1_C + 273.15, A1, V_stage1)
+            outlet_stage1, res1, traj1 = solve_stage_batch(init_state, k1, Q1 / V_stage1, sugar_adj, hours, method,
+                                                           trajectory_points)
+            outlet_stage1 = outlet_stage1[stage1_of]
+            k2 = stage_rate_constants(params, T2_C + 273.15, A2, V_stage2)
+            outlet_stage2, res2, traj2 = solve_stage_batch(outlet_stage1, k2, Q2 / V_stage2, outlet_stage1[:, 0], hours,
+                                                           method, trajectory_points)
+            cost = np.tile([res1.nfev + res2.nfev, res1.njev + res2.njev, res1.nlu + res2.nlu], (len(stage2_keys), 1))
+    except Exception:
+        # One bad scenario should not sink the batch: fall back to the per-scenario path
+        return [simulate_two_stage_system(*scenario, hours=hours, method=batch_solver_settings(method)['method'], mode=mode,
+                                          trajectory_points=trajectory_points)
+                for scenario in scenarios]
+
+    ch4 = outlet_stage2[:, 6]
+    biogas = ch4 * (Q2 / 1000) * 0.65 / (hours / 24)
+    wall_share = (time.perf_counter() - start) / len(scenarios)
+    results = [
+        {'CH4_Yield': ch4[j], 'Biogas_Flow': biogas[j], 'Final_VFA': outlet_stage2[j, 7], 'Final_NH3': outlet_stage2[j, 8],
+         'nfev': cost[j, 0], 'njev': cost[j, 1], 'nlu': cost[j, 2], 'wall_s': wall_share, 'batched': 1.0}
+        for j in stage2_of
+    ]
+    if trajectory_points:
+        for result, j in zip(results, stage2_of):
+            result['trajectory'] = np.stack([traj1[stage1_of[j]], traj2[j]]).astype(np.float32)
+    return results
+
 # Dataset generation
 flows = np.linspace(30, 180, 6)
 temps = [(28, 32), (32, 36), (36, 40), (40, 45)]
@@ -125,38 +584,261 @@ recycle_ratios = np.linspace(0.05, 0.5, 5)
 palm_fracs = np.linspace(0.0, 0.5, 6)
 sugars = np.linspace(2.0, 10.0, 5)
 
-records = []
-for Q in flows:
-    for (T1, T2) in temps:
-        for A1 in agitator1_powers:
-            for A2 in agitator2_powers:
-                for R in recycle_ratios:
-                    for PF in palm_fracs:
-                        for S in sugars:
-                            result = simulate_two_stage_system(Q, T1, T2, A1, A2, R, PF, S)
-                            if not np.isfinite(result['CH4_Yield']):
-                                continue
-                            records.append({
-                                'FlowRate': Q,
-                                'Temp1': T1,
-                                'Temp2': T2,
-                                'Agitator1_kW': A1,
-                                'Agitator2_kW': A2,
-                                'Recycle_Ratio': R,
-                                'PalmFrac': PF,
-                                'SugarIn': S,
-                                'OLR': (Q * VS_in) / (V_stage1 + V_stage2),
-                                'HRT1': V_stage1 / Q,
-                                'HRT2': V_stage2 / Q,
-                                'VFA': result['Final_VFA'],
-                                'NH3': result['Final_NH3'],
-                                'CH4_Yield': result['CH4_Yield'],
-                                'Biogas_Flow': result['Biogas_Flow']
-                            })
-
-df = pd.DataFrame(records)
-output_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
-os.makedirs(output_dir, exist_ok=True)
-df.to_csv(os.path.join(output_dir, "training_data.csv"), index=False)
-df.sample(frac=0.2, random_state=42).to_csv(os.path.join(output_dir, "validation_data.csv"), index=False)
-print(" Data generated and saved.")
+# Axis bounds for samplers that do not use the fixed grid levels above
+SCENARIO_FIELDS = tuple(INPUT_COLUMNS)
+SCENARIO_BOUNDS = {
+    'FlowRate': (flows.min(), flows.max()),
+    'Temp1': (min(t[0] for t in temps), max(t[0] for t in temps)),
+    'Temp2': (min(t[1] for t in temps), max(t[1] for t in temps)),
+    'Agitator1_kW': (agitator1_powers.min(), agitator1_powers.max()),
+    'Agitator2_kW': (agitator2_powers.min(), agitator2_powers.max()),
+    'Recycle_Ratio': (recycle_ratios.min(), recycle_ratios.max()),
+    'PalmFrac': (palm_fracs.min(), palm_fracs.max()),
+    'SugarIn': (sugars.min(), sugars.max()),
+}
+
+# Per-scenario record builder (one training row)
+def build_record(Q, T1, T2, A1, A2, RR, PF, S, result):
+    return {
+        'FlowRate': Q,
+        'Temp1': T1,
+        'Temp2': T2,
+        'Agitator1_kW': A1,
+        'Agitator2_kW': A2,
+        'Recycle_Ratio': RR,
+        'PalmFrac': PF,
+        'SugarIn': S,
+        **derived_features(Q),
+        'VFA': result['Final_VFA'],
+        'NH3': result['Final_NH3'],
+        'CH4_Yield': result['CH4_Yield'],
+        'Biogas_Flow': result['Biogas_Flow']
+    }
+
+def build_grid():
+    # Stage-1 axes outermost so each sweep chunk holds whole stage-1 groups and reuses
+    # their solves across the stage-2-only axes (agitator 2, recycle ratio)
+    return [
+        (Q, T1, T2, A1, A2, RR, PF, S)
+        for Q in flows
+        for (T1, T2) in temps
+        for A1 in agitator1_powers
+        for PF in palm_fracs
+        for S in sugars
+        for A2 in agitator2_powers
+        for RR in recycle_ratios
+    ]
+
+def open_cache(cache_path, hours=30, method=None, mode="dynamic"):
+    from sim_cache import SimulationCache
+    return SimulationCache(cache_path, params, dict(batch_solver_settings(method), mode=mode), hours, MODEL_VERSION)
+
+# Cached batch simulation: only scenarios missing from the cache are solved
+def simulate_two_stage_cached(scenarios, cache, hours=30, method=None, mode="dynamic"):
+    results = cache.get_many(scenarios)
+    for r in results:
+        if r is not None:
+            r['cached'] = 1.0
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        fresh = simulate_two_stage_batch([scenarios[i] for i in missing], hours=hours, method=method, mode=mode)
+        cache.put_many([scenarios[i] for i in missing], fresh)
+        for i, r in zip(missing, fresh):
+            results[i] = r
+    return results
+
+def existing_dataset(output_dir):
+    # <output_dir>/dataset if it already holds anything, else None
+    root = os.path.join(output_dir, "dataset")
+    return root if os.path.isdir(root) and os.listdir(root) else None
+
+def save_datasets(df, output_dir, fmt="parquet", csv=False, overwrite=False):
+    # Writes <output_dir>/dataset from scratch; an existing dataset (e.g. a grid sweep's) is only
+    # replaced when overwrite is set
+    import shutil
+    from dataset_store import write_dataframe, export_csv
+
+    root = os.path.join(output_dir, "dataset")
+    if existing_dataset(output_dir):
+        if not overwrite:
+            raise FileExistsError(f"{root} already holds a dataset; use another output directory or overwrite it")
+        shutil.rmtree(root, ignore_errors=True)
+    write_dataframe(df, root, fmt=fmt)
+    if csv:
+        export_csv(root, output_dir)
+    print(" Data generated and saved.")
+
+# A resumed sweep skips chunks already on disk, so when --trajectories is first given on a resume
+# their slots would stay pending for good. Those chunks are simulated again for their trajectories
+# only; their dataset parts are left as they are. Returns the number of scenarios backfilled.
+def backfill_trajectories(store_path, scenarios, writer, chunk_size, shard=None, workers=None, method=None):
+    from functools import partial
+    from sweep_engine import check_manifest, chunk_scenarios, grid_fingerprint, map_chunks, shard_chunks
+    from trajectory_store import NOT_WRITTEN, TrajectoryStore
+
+    status = np.asarray(TrajectoryStore(store_path).status)
+    n_chunks = len(chunk_scenarios(scenarios, chunk_size))
+    # Chunk i only maps to these scenario ids if the work directory holds this grid and chunk size
+    check_manifest(writer.root, grid_fingerprint(scenarios, chunk_size), n_chunks)
+    done = [i for i in shard_chunks(n_chunks, shard) if writer.exists(i)]
+    ids = [k for i in done for k in range(i * chunk_size, min((i + 1) * chunk_size, len(scenarios)))
+           if status[k] == NOT_WRITTEN]
+    if ids:
+        print(f" Backfilling trajectories for {len(ids)} scenarios from {len(done)} chunks finished without them")
+        map_chunks([scenarios[k] for k in ids], partial(simulate_chunk, method=method, trajectories=store_path),
+                   workers=workers, chunk_size=chunk_size)
+    return len(ids)
+
+# Per-scenario solver cost for each stiff backend, with and without the analytical Jacobian
+def solver_report(scenarios, methods=STIFF_METHODS):
+    rows = []
+    for method in methods:
+        for analytic_jac in (False, True):
+            nfev = njev = nlu = 0
+            start = time.perf_counter()
+            for scenario in scenarios:
+                result = simulate_two_stage_system(*scenario, method=method, analytic_jac=analytic_jac)
+                nfev += result.get('nfev', 0)
+                njev += result.get('njev', 0)
+                nlu += result.get('nlu', 0)
+            elapsed = time.perf_counter() - start
+            rows.append({
+                'method': method,
+                'jacobian': 'analytic' if analytic_jac else 'finite-diff',
+                'nfev': nfev / len(scenarios),
+                'njev': njev / len(scenarios),
+                'nlu': nlu / len(scenarios),
+                'ms_per_scenario': 1000 * elapsed / len(scenarios),
+            })
+    return pd.DataFrame(rows)
+
+# Sweep worker: runs in a pool process, so it must stay at module level.
+# With telemetry=True it also returns one solver-telemetry row per scenario, failures included.
+# With trajectories (a trajectory_store directory) it writes each scenario's full time series there;
+# those solves bypass the simulation cache, which only holds final values
+def simulate_chunk(scenarios, cache_path=None, method=None, mode="dynamic", telemetry=False, trajectories=None):
+    if trajectories:
+        from trajectory_store import open_store
+        store = open_store(trajectories)
+        results = simulate_two_stage_batch(scenarios, hours=store.meta['hours'], method=method, mode=mode,
+                                           trajectory_points=store.points)
+        store.write(scenarios, results)
+    elif cache_path:
+        cache = open_cache(cache_path, method=method, mode=mode)
+        try:
+            results = simulate_two_stage_cached(scenarios, cache, method=method, mode=mode)
+        finally:
+            cache.close()
+    else:
+        results = simulate_two_stage_batch(scenarios, method=method, mode=mode)
+
+    records = []
+    for scenario, result in zip(scenarios, results):
+        if not np.isfinite(result['CH4_Yield']):
+            continue
+        records.append(build_record(*scenario, result))
+    if telemetry:
+        from telemetry import telemetry_rows
+        return records, telemetry_rows(scenarios, results)
+    return records
+
+
+if __name__ == "__main__":
+    import argparse
+    from functools import partial
+    from sweep_engine import parse_shard, run_sweep
+    from dataset_store import PartWriter, FORMATS, export_csv, merge_datasets
+
+    output_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
+
+    parser = argparse.ArgumentParser(description="Generate the two-stage AD training dataset")
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="scenarios per on-disk chunk")
+    parser.add_argument("--output-dir", default=output_dir)
+    parser.add_argument("--work-dir", default=None, help="dataset directory chunks stream into (default: <output-dir>/dataset)")
+    parser.add_argument("--format", choices=FORMATS, default="parquet", help="part file format")
+    parser.add_argument("--csv", action="store_true", help="also export training_data.csv / validation_data.csv")
+    parser.add_argument("--cache", default=None, help="simulation cache file (default: <output-dir>/sim_cache.sqlite)")
+    parser.add_argument("--no-cache", action="store_true", help="always re-simulate every scenario")
+    parser.add_argument("--method", choices=BATCH_METHODS, default=BATCH_SOLVER['method'], help="stiff solver for batched solves")
+    parser.add_argument("--mode", choices=SIM_MODES, default="dynamic",
+                        help="integrate each stage over the horizon, or solve its operating point directly; "
+                             "steady_state is a different CH4_Yield target (methane at the operating point), "
+                             "not a faster route to the dynamic one")
+    parser.add_argument("--shard", default=None, metavar="i/N", help="only run shard i of N (0-based)")
+    parser.add_argument("--queue", default=None, help="SQLite work-queue file shared by several hosts")
+    parser.add_argument("--merge", nargs="+", default=None, metavar="DATASET_DIR",
+                        help="merge shard dataset directories into <output-dir>/dataset, then exit")
+    parser.add_argument("--allow-partial", action="store_true", help="merge even if some chunks are missing")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="record per-scenario solver telemetry to <work-dir>/_telemetry and print a summary")
+    parser.add_argument("--profile-worst", type=int, metavar="N", default=0,
+                        help="with --telemetry: re-run the N worst scenarios under cProfile into <work-dir>/_profiles")
+    parser.add_argument("--trajectories", default=None, metavar="DIR",
+                        help="also store every scenario's full state time series in this memory-mapped store")
+    parser.add_argument("--trajectory-points", type=int, default=300, help="time points per stored trajectory")
+    parser.add_argument("--solver-report", type=int, metavar="N", default=0,
+                        help="print per-scenario nfev/njev and timing for N sampled scenarios per solver backend, then exit")
+    args = parser.parse_args()
+
+    if args.merge:
+        merged = os.path.join(args.output_dir, "dataset")
+        stats = merge_datasets(args.merge, merged, fmt=args.format, allow_partial=args.allow_partial)
+        print(f" Merged {stats['chunks']} chunks: {stats['rows']} rows, {stats['duplicates']} duplicates dropped, "
+              f"{len(stats['missing'])} chunks missing")
+        if args.csv:
+            export_csv(merged, args.output_dir)
+        raise SystemExit
+
+    if args.trajectories and args.mode != "dynamic":
+        parser.error("--trajectories needs --mode dynamic")
+
+    grid = build_grid()
+    if args.solver_report:
+        rng = np.random.default_rng(42)
+        sample = [grid[i] for i in rng.choice(len(grid), size=min(args.solver_report, len(grid)), replace=False)]
+        print(solver_report(sample).to_string(index=False))
+        raise SystemExit
+    stage1_keys, stage2_keys, _ = stage_plan(grid)
+    print(f" {len(grid)} scenarios -> {len(stage1_keys)} stage-1 and {len(stage2_keys)} stage-2 solves")
+
+    # Each finished chunk is streamed straight into the partitioned dataset, so memory
+    # stays flat however large the grid is
+    work_dir = args.work_dir or os.path.join(args.output_dir, "dataset")
+    cache_path = None if args.no_cache else (args.cache or os.path.join(args.output_dir, "sim_cache.sqlite"))
+    queue = None
+    if args.queue:
+        from work_queue import WorkQueue
+        queue = WorkQueue(args.queue)
+    telemetry = None
+    if args.telemetry:
+        from telemetry import TelemetryWriter
+        telemetry = TelemetryWriter(work_dir)
+    writer = PartWriter(work_dir, args.format)
+    shard = parse_shard(args.shard) if args.shard else None
+    if args.trajectories:
+        from trajectory_store import TrajectoryStore
+        TrajectoryStore.create(args.trajectories, grid, points=args.trajectory_points)
+        backfill_trajectories(args.trajectories, grid, writer, args.chunk_size, shard=shard, workers=args.workers,
+                              method=args.method)
+    run_sweep(grid, partial(simulate_chunk, cache_path=cache_path, method=args.method, mode=args.mode,
+                            telemetry=args.telemetry, trajectories=args.trajectories), work_dir,
+              workers=args.workers, chunk_size=args.chunk_size, writer=writer, shard=shard, queue=queue,
+              telemetry=telemetry)
+    if args.telemetry:
+        from telemetry import read_telemetry, summarize, profile_worst
+        table = read_telemetry(work_dir)
+        print(summarize(table))
+        if args.profile_worst:
+            path = profile_worst(table, args.profile_worst, os.path.join(work_dir, "_profiles"),
+                                 method=args.method, mode=args.mode)
+            print(f" Profiles of the {args.profile_worst} worst scenarios: {path}")
+    if args.trajectories:
+        print(TrajectoryStore(args.trajectories).summary())
+    if args.shard or args.queue:
+        # Other shards/hosts may still be running; combine their outputs with --merge
+        raise SystemExit
+
+    if args.csv:
+        export_csv(work_dir, args.output_dir)
+    print(" Data generated and saved.")
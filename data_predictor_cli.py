@@ -1,12 +1,28 @@
+import argparse
+import sys
+import time
 import pandas as pd
+import numpy as np
 import joblib
 import os
+from features import prepare_features, feature_names_for
+from model_artifact import load_shared
 
 
 # Load Trained Model
 
 model_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\trained_model.joblib"
-model = joblib.load(model_path)
+model = None
+
+
+def load_model(path=None, batch=True):
+    # Chunked batches use scikit-learn's compiled predict, the fastest for many rows. A single
+    # interactive prediction maps the shared tree arrays instead, which starts almost instantly.
+    # A .shared artifact directory has no pickled model to load, so it is always mapped.
+    global model
+    path = path or model_path
+    model = joblib.load(path) if batch and not os.path.isdir(path) else load_shared(path)
+    return model
 
 
 # Predict from CLI Input
@@ -30,16 +46,8 @@ def predict_methane_yield_cli():
         print("❌ Invalid input. Please enter numeric values.")
         return
 
-    # Derived parameters
-    VS_in = 25.0
-    V1 = 300
-    V2 = 700
-    total_V = V1 + V2
-    olr = (flow * VS_in) / total_V
-    hrt1 = V1 / flow
-    hrt2 = V2 / flow
-
-    input_df = pd.DataFrame([{
+    # Derived parameters (OLR/HRT1/HRT2) and column order come from features.py
+    input_df = prepare_features({
         'FlowRate': flow,
         'Temp1': temp1,
         'Temp2': temp2,
@@ -48,19 +56,143 @@ def predict_methane_yield_cli():
         'Recycle_Ratio': recycle_ratio,
         'PalmFrac': palm_frac,
         'SugarIn': sugar_in,
-        'OLR': olr,
-        'HRT1': hrt1,
-        'HRT2': hrt2,
         'VFA': vfa,
         'NH3': nh3,
         'Biogas_Flow': biogas_flow
-    }])
+    }, feature_names_for(model))
 
     prediction = model.predict(input_df)[0]
     print(f"\n✅ Predicted Methane Yield: {round(prediction, 4)} L CH₄ / L reactor volume")
 
 
+# Batch / streaming mode: read fixed-size chunks, predict, write each chunk out before reading the next
+
+PREDICTION_COLUMN = "Predicted_CH4_Yield"
+
+
+def input_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if path == "-":
+        return "ndjson"
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}.get(ext, "ndjson")
+
+
+def read_chunks(path, fmt, chunk_size):
+    source = sys.stdin if path == "-" else path
+    if fmt == "csv":
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        # Parquet needs a seekable file, so it is never read from stdin
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_json(source, lines=True, chunksize=chunk_size)
+
+
+class ChunkOutput:
+    # Streams predictions to stdout or a file as CSV, NDJSON or Parquet
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.parquet_writer = None
+        self.first = True
+        if fmt != "parquet":
+            self.stream = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+
+    def write(self, df):
+        if self.fmt == "csv":
+            df.to_csv(self.stream, header=self.first, index=False, lineterminator="\n")
+        elif self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+        else:
+            text = df.to_json(orient="records", lines=True)
+            # Older pandas leaves off the final newline, which would glue two chunks together
+            self.stream.write(text if text.endswith("\n") or not text else text + "\n")
+        if self.fmt != "parquet":
+            self.stream.flush()
+        self.first = False
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        elif self.fmt != "parquet" and self.stream is not sys.stdout:
+            self.stream.close()
+
+
+def predict_chunk(chunk, feature_names):
+    # A stopped or bad flow reading (<= 0, inf) has no HRT: blank it so only that row is skipped
+    inputs = chunk
+    if 'FlowRate' in chunk:
+        flow = pd.to_numeric(chunk['FlowRate'], errors='coerce')
+        inputs = chunk.assign(FlowRate=flow.where(np.isfinite(flow) & (flow > 0)))
+    X = prepare_features(inputs, feature_names)
+    # Rows with missing or invalid inputs get NaN instead of failing the whole chunk
+    valid = X.notna().all(axis=1).to_numpy()
+    predictions = np.full(len(X), np.nan)
+    if valid.any():
+        predictions[valid] = model.predict(X[valid])
+    return chunk.assign(**{PREDICTION_COLUMN: predictions}), int((~valid).sum())
+
+
+def predict_stream(input_path, output_path="-", fmt=None, output_fmt=None, chunk_size=10_000):
+    fmt = input_format(input_path, fmt)
+    output_fmt = output_fmt or (fmt if output_path == "-" and fmt != "parquet" else input_format(output_path))
+    if output_fmt == "parquet" and output_path == "-":
+        raise ValueError("Parquet output needs --output FILE")
+    feature_names = feature_names_for(model)
+
+    output = ChunkOutput(output_path, output_fmt)
+    rows = skipped = chunks = 0
+    start = time.perf_counter()
+    try:
+        for chunk in read_chunks(input_path, fmt, chunk_size):
+            result, n_skipped = predict_chunk(chunk, feature_names)
+            output.write(result)
+            rows += len(chunk)
+            skipped += n_skipped
+            chunks += 1
+    finally:
+        output.close()
+    elapsed = time.perf_counter() - start
+
+    # Summary goes to stderr so it never mixes with results streamed to stdout
+    print(
+        f" Predicted {rows} rows in {chunks} chunks in {elapsed:.2f}s "
+        f"({rows / elapsed if elapsed > 0 else 0.0:,.0f} rows/s)", file=sys.stderr
+    )
+    if skipped:
+        print(f" {skipped} rows had missing or invalid inputs and were written with an empty prediction", file=sys.stderr)
+    return rows, elapsed
+
+
 # Run CLI
 
 if __name__ == "__main__":
-    predict_methane_yield_cli()
+    parser = argparse.ArgumentParser(description="Methane-yield prediction, interactive or in batch")
+    parser.add_argument("--input", default=None,
+                        help="CSV/Parquet file, or '-' for newline-delimited JSON on stdin (omit for interactive prompts)")
+    parser.add_argument("--format", choices=["csv", "parquet", "ndjson"], default=None,
+                        help="input format (default: from the file extension)")
+    parser.add_argument("--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--output-format", choices=["csv", "parquet", "ndjson"], default=None,
+                        help="output format (default: from the output extension, or the input format on stdout)")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="rows read and predicted at a time")
+    parser.add_argument("--model", default=model_path, help="trained_model.joblib or its .shared artifact directory")
+    args = parser.parse_args()
+
+    load_model(args.model, batch=args.input is not None)
+    if args.input is None:
+        predict_methane_yield_cli()
+    else:
+        try:
+            predict_stream(args.input, args.output, args.format, args.output_format, args.chunk_size)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
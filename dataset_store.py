@@ -0,0 +1,185 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from features import FEATURE_COLUMNS, INPUT_COLUMNS, TARGET_COLUMNS
+from sweep_engine import temp_path
+
+
+# Columnar training dataset: one part file per sweep chunk, hive-partitioned by split
+#   <root>/split=train/part-00012.parquet
+#   <root>/split=validation/part-00012.parquet
+# training_data.csv always contained the validation rows as well, so reading with
+# split=None (all partitions) gives the same training set as before.
+
+DATASET_COLUMNS = FEATURE_COLUMNS + TARGET_COLUMNS
+SCHEMA = pa.schema([(c, pa.float32()) for c in DATASET_COLUMNS])
+SPLIT_INPUTS = INPUT_COLUMNS
+VALIDATION_PERCENT = 20
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def row_keys(df):
+    return pd.util.hash_pandas_object(df[SPLIT_INPUTS].astype(np.float32), index=False).to_numpy()
+
+
+def validation_mask(df):
+    # Hash the scenario inputs so a row lands in the same split however the sweep is chunked
+    return row_keys(df) % 100 < VALIDATION_PERCENT
+
+
+def to_table(df):
+    return pa.Table.from_pandas(df[DATASET_COLUMNS].astype(np.float32), schema=SCHEMA, preserve_index=False)
+
+
+def write_table(table, path, fmt):
+    # Hidden, per-writer temp name so readers never pick up a half-written part
+    tmp_path = temp_path(path)
+    if fmt == "arrow":
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+    else:
+        pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class PartWriter:
+    """Chunk writer for sweep_engine.run_sweep that streams chunks into a split-partitioned dataset."""
+
+    def __init__(self, root, fmt="parquet"):
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {tuple(FORMATS)}, got {fmt!r}")
+        self.root = root
+        self.fmt = fmt
+        for split in ("train", "validation"):
+            os.makedirs(os.path.join(root, f"split={split}"), exist_ok=True)
+
+    def part_path(self, split, index):
+        return os.path.join(self.root, f"split={split}", f"part-{index:05d}{FORMATS[self.fmt]}")
+
+    def path(self, index):
+        return self.part_path("train", index)
+
+    def exists(self, index):
+        # The train part is written last, so its presence means the whole chunk landed
+        return os.path.exists(self.path(index))
+
+    def write(self, records, index):
+        df = pd.DataFrame(records, columns=DATASET_COLUMNS)
+        mask = validation_mask(df)
+        write_table(to_table(df[mask]), self.part_path("validation", index), self.fmt)
+        write_table(to_table(df[~mask]), self.part_path("train", index), self.fmt)
+
+
+def write_dataframe(df, root, fmt="parquet", batch_rows=50_000):
+    writer = PartWriter(root, fmt)
+    for index, start in enumerate(range(0, len(df), batch_rows)):
+        writer.write(df.iloc[start:start + batch_rows], index)
+    return writer
+
+
+def open_dataset(root, fmt=None, memory_map=True):
+    if fmt is None:
+        fmt = "arrow" if any(f.endswith(".arrow") for _, _, files in os.walk(root) for f in files) else "parquet"
+    return ds.dataset(
+        root, format="ipc" if fmt == "arrow" else "parquet", partitioning="hive",
+        filesystem=fs.LocalFileSystem(use_mmap=memory_map)
+    )
+
+
+def read_dataset(root, columns=None, split=None, fmt=None, memory_map=True):
+    """Read only the requested columns; split=None reads train and validation together."""
+    dataset = open_dataset(root, fmt, memory_map)
+    flt = ds.field("split") == split if split else None
+    return dataset.to_table(columns=columns or DATASET_COLUMNS, filter=flt).to_pandas()
+
+
+def iter_batches(root, columns=None, split=None, fmt=None, batch_rows=65_536):
+    dataset = open_dataset(root, fmt)
+    flt = ds.field("split") == split if split else None
+    for batch in dataset.to_batches(columns=columns or DATASET_COLUMNS, filter=flt, batch_size=batch_rows):
+        yield batch.to_pandas()
+
+
+def export_csv(root, output_dir):
+    # Stream the dataset back out as the legacy CSV pair without holding it all in memory
+    train_path = os.path.join(output_dir, "training_data.csv")
+    val_path = os.path.join(output_dir, "validation_data.csv")
+    for path, split in ((train_path, None), (val_path, "validation")):
+        first = True
+        for batch in iter_batches(root, split=split):
+            batch.to_csv(path, mode="w" if first else "a", header=first, index=False)
+            first = False
+
+
+# Merging shard outputs: one dataset per shard (or host) in, one deduplicated dataset out
+
+def read_part(path):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=DATASET_COLUMNS)
+    if path.endswith(".arrow"):
+        return feather.read_table(path).to_pandas()
+    return pq.read_table(path).to_pandas()
+
+
+def merge_datasets(roots, out_root, fmt="parquet", allow_partial=False):
+    from sweep_engine import read_manifest
+
+    if os.path.abspath(out_root) in {os.path.abspath(root) for root in roots}:
+        raise ValueError("merge into a fresh directory, not one of the shard directories")
+
+    manifests = [read_manifest(root) for root in roots]
+    if any(m is None for m in manifests):
+        raise ValueError("every shard directory needs the _manifest.json its sweep wrote")
+    if len({m["fingerprint"] for m in manifests}) != 1:
+        raise ValueError("shard directories come from different grids or chunk sizes")
+    n_chunks = manifests[0]["n_chunks"]
+
+    readers = [PartWriter(root, fmt) for root in roots]
+    source = {}
+    for i in range(n_chunks):
+        for reader in readers:
+            if reader.exists(i):
+                source[i] = reader
+                break
+    missing = [i for i in range(n_chunks) if i not in source]
+    if missing and not allow_partial:
+        raise ValueError(f"{len(missing)}/{n_chunks} chunks missing from every shard, e.g. {missing[:10]}")
+
+    os.makedirs(out_root, exist_ok=True)
+    writer = PartWriter(out_root, fmt)
+    seen = set()
+    rows = duplicates = 0
+    for i in sorted(source):
+        reader = source[i]
+        df = pd.concat([read_part(reader.part_path("train", i)), read_part(reader.part_path("validation", i))],
+                       ignore_index=True)
+        keys = row_keys(df)
+        keep = np.array([k not in seen for k in keys], dtype=bool)
+        # Also drops repeats inside the chunk itself
+        _, first = np.unique(keys, return_index=True)
+        keep &= np.isin(np.arange(len(df)), first)
+        seen.update(keys[keep].tolist())
+        duplicates += int((~keep).sum())
+        rows += int(keep.sum())
+        writer.write(df[keep], i)
+
+    with open(os.path.join(out_root, "_manifest.json"), "w") as f:
+        json.dump(manifests[0], f)
+    return {'chunks': len(source), 'missing': missing, 'rows': rows, 'duplicates': duplicates}
+
+
+# Entry point for the analysis scripts: prefer the columnar dataset, fall back to the CSV
+
+def load_dataset(data_dir, columns=None, split=None):
+    root = os.path.join(data_dir, "dataset")
+    if os.path.isdir(root):
+        return read_dataset(root, columns=columns, split=split)
+    csv_name = "validation_data.csv" if split == "validation" else "training_data.csv"
+    return pd.read_csv(os.path.join(data_dir, csv_name), usecols=columns)
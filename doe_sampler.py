@@ -0,0 +1,113 @@
+import argparse
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from sklearn.ensemble import GradientBoostingRegressor
+
+from data_generator import SCENARIO_BOUNDS, SCENARIO_FIELDS, existing_dataset, save_datasets, simulate_chunk
+from sweep_engine import map_chunks
+
+
+# Space-filling designs over the scenario bounds, in place of the full-factorial grid
+
+lower = np.array([SCENARIO_BOUNDS[f][0] for f in SCENARIO_FIELDS], dtype=float)
+upper = np.array([SCENARIO_BOUNDS[f][1] for f in SCENARIO_FIELDS], dtype=float)
+
+
+def latin_hypercube(n, seed=42):
+    unit = qmc.LatinHypercube(d=len(SCENARIO_FIELDS), seed=seed).random(n)
+    return qmc.scale(unit, lower, upper)
+
+
+def sobol(n, seed=42):
+    # Draw the next power of two so the sequence keeps its balance properties, then trim
+    m = int(np.ceil(np.log2(max(n, 2))))
+    unit = qmc.Sobol(d=len(SCENARIO_FIELDS), scramble=True, seed=seed).random_base2(m)[:n]
+    return qmc.scale(unit, lower, upper)
+
+
+def to_scenarios(points):
+    return [tuple(float(x) for x in row) for row in points]
+
+
+def simulate_points(points, simulate, workers):
+    return pd.DataFrame(map_chunks(to_scenarios(points), simulate, workers=workers, chunk_size=250))
+
+
+# Active learning: a committee of boosted models trained on what has been simulated so far
+# picks the candidates it disagrees on most, and only those get simulated next
+
+def fit_committee(df, n_models=5, seed=42):
+    X = df[list(SCENARIO_FIELDS)].to_numpy()
+    y = df['CH4_Yield'].to_numpy()
+    committee = []
+    for i in range(n_models):
+        model = GradientBoostingRegressor(
+            n_estimators=150, learning_rate=0.1, max_depth=4, subsample=0.8, random_state=seed + i
+        )
+        committee.append(model.fit(X, y))
+    return committee
+
+
+def committee_spread(committee, points):
+    predictions = np.stack([model.predict(points) for model in committee])
+    return predictions.std(axis=0)
+
+
+def active_learning(n_total, simulate, workers, initial_frac=0.3, rounds=5, pool_factor=20, seed=42):
+    n_initial = max(int(n_total * initial_frac), 50)
+    df = simulate_points(sobol(n_initial, seed=seed), simulate, workers)
+    per_round = max((n_total - n_initial) // rounds, 1)
+
+    for r in range(rounds):
+        if len(df) >= n_total:
+            break
+        committee = fit_committee(df, seed=seed)
+        candidates = latin_hypercube(per_round * pool_factor, seed=seed + r + 1)
+        spread = committee_spread(committee, candidates)
+        chosen = candidates[np.argsort(spread)[::-1][:min(per_round, n_total - len(df))]]
+        df = pd.concat([df, simulate_points(chosen, simulate, workers)], ignore_index=True)
+        print(f" Round {r + 1}/{rounds}: {len(df)} scenarios, mean committee spread {spread.mean():.5f}")
+    return df
+
+
+SAMPLERS = ("lhs", "sobol", "active")
+
+
+if __name__ == "__main__":
+    from dataset_store import FORMATS
+
+    output_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
+
+    parser = argparse.ArgumentParser(description="Generate the training dataset from a sampled design instead of the full grid")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="active")
+    parser.add_argument("--n", type=int, default=9000, help="number of scenarios to simulate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=5, help="active-learning rounds")
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: all cores)")
+    parser.add_argument("--output-dir", default=output_dir)
+    parser.add_argument("--cache", default=None, help="simulation cache file (default: <output-dir>/sim_cache.sqlite)")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--format", choices=FORMATS, default="parquet", help="dataset part file format")
+    parser.add_argument("--csv", action="store_true", help="also export training_data.csv / validation_data.csv")
+    parser.add_argument("--overwrite", action="store_true", help="replace a dataset already in <output-dir>/dataset")
+    args = parser.parse_args()
+
+    # Checked before simulating anything, so a clash does not cost a whole run
+    if existing_dataset(args.output_dir) and not args.overwrite:
+        parser.error(f"{existing_dataset(args.output_dir)} already holds a dataset; pass --overwrite or another --output-dir")
+
+    cache_path = None if args.no_cache else (args.cache or os.path.join(args.output_dir, "sim_cache.sqlite"))
+    simulate = partial(simulate_chunk, cache_path=cache_path)
+
+    if args.sampler == "lhs":
+        df = simulate_points(latin_hypercube(args.n, seed=args.seed), simulate, args.workers)
+    elif args.sampler == "sobol":
+        df = simulate_points(sobol(args.n, seed=args.seed), simulate, args.workers)
+    else:
+        df = active_learning(args.n, simulate, args.workers, rounds=args.rounds, seed=args.seed)
+
+    save_datasets(df, args.output_dir, fmt=args.format, csv=args.csv, overwrite=args.overwrite)
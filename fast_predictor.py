@@ -0,0 +1,122 @@
+import numpy as np
+
+
+# Flattened gradient-boosting ensemble for low-latency prediction.
+# All trees are packed into contiguous node arrays (feature, threshold, left, right, value),
+# and every tree is walked in lock-step with NumPy, one level at a time. Leaves point back at
+# themselves, so walking max_depth levels always ends on a leaf.
+
+class TreeEnsemble:
+    def __init__(self, feature, threshold, left, right, value, roots, baseline, max_depth, feature_names,
+                 dtype=np.float32, count=None, children=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.baseline = float(baseline)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+        # Input precision the trees were split in: float32 for GradientBoosting, float64 for HistGradientBoosting
+        self.dtype = np.dtype(dtype)
+        # Training samples per node, for path-based attribution (None for older exports)
+        self.count = count
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self.children = np.stack([left, right], axis=1).ravel() if children is None else children
+
+    @classmethod
+    def from_model(cls, model):
+        # GradientBoostingRegressor and HistGradientBoostingRegressor both flatten to the same arrays
+        n_features = model.n_features_in_
+        is_hist = hasattr(model, "_predictors")
+        trees = hist_trees(model) if is_hist else gbr_trees(model)
+        baseline = model_baseline(model)
+
+        feature, threshold, left, right, value, count, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree_feature, tree_threshold, tree_left, tree_right, tree_value, tree_count, is_leaf, depth in trees:
+            n = len(tree_feature)
+            node_ids = np.arange(n)
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree_feature))
+            threshold.append(np.where(is_leaf, 0.0, tree_threshold))
+            left.append(np.where(is_leaf, node_ids, tree_left) + offset)
+            right.append(np.where(is_leaf, node_ids, tree_right) + offset)
+            value.append(tree_value)
+            count.append(tree_count)
+            max_depth = max(max_depth, depth)
+            offset += n
+
+        names = getattr(model, "feature_names_in_", [f"x{i}" for i in range(n_features)])
+        return cls(
+            np.concatenate(feature).astype(np.intp), np.concatenate(threshold),
+            np.concatenate(left).astype(np.intp), np.concatenate(right).astype(np.intp),
+            np.concatenate(value), np.array(roots, dtype=np.intp), baseline, max_depth, names,
+            np.float64 if is_hist else np.float32, np.concatenate(count).astype(np.float64)
+        )
+
+    # Evaluation. Inputs are cast to the model's split precision first, as scikit-learn does,
+    # so split decisions match model.predict exactly
+
+    def predict_one(self, x):
+        x = np.asarray(x, dtype=self.dtype)
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            go_right = x.take(self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_right)
+        return self.baseline + self.value.take(nodes).sum()
+
+    def predict(self, X, batch_rows=256):
+        X = np.asarray(X, dtype=self.dtype)
+        if X.ndim == 1:
+            return np.array([self.predict_one(X)])
+        n_features = X.shape[1]
+        out = np.empty(len(X))
+        # Small blocks keep the (rows x trees) node matrix in cache
+        for start in range(0, len(X), batch_rows):
+            block = X[start:start + batch_rows]
+            flat = block.ravel()
+            row_offsets = (np.arange(len(block)) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (len(block), len(self.roots)))
+            for _ in range(self.max_depth):
+                go_right = flat.take(row_offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+                nodes = self.children.take(2 * nodes + go_right)
+            out[start:start + batch_rows] = self.baseline + self.value.take(nodes).sum(axis=1)
+        return out
+
+
+# Per-tree node arrays: (feature, threshold, left, right, value, count, is_leaf, depth)
+
+def model_baseline(model):
+    if hasattr(model, "_baseline_prediction"):
+        return np.ravel(model._baseline_prediction)[0]
+    if model.init_ == "zero":
+        return 0.0
+    return model.init_.predict(np.zeros((1, model.n_features_in_)))[0]
+
+
+def gbr_trees(model):
+    for estimator in model.estimators_[:, 0]:
+        tree = estimator.tree_
+        # Shrinkage is folded into the leaf values once, here
+        yield (
+            tree.feature, tree.threshold, tree.children_left, tree.children_right,
+            tree.value[:, 0, 0] * model.learning_rate, tree.weighted_n_node_samples,
+            tree.children_left == -1, tree.max_depth
+        )
+
+
+def hist_trees(model):
+    # Leaf values already include shrinkage. The evaluator has no missing-value branch, so
+    # inputs must be complete, as they are everywhere in this pipeline.
+    for (predictor,) in model._predictors:
+        nodes = predictor.nodes
+        if nodes["is_categorical"].any():
+            raise ValueError("categorical splits are not supported by the flattened evaluator")
+        yield (
+            nodes["feature_idx"], nodes["num_threshold"], nodes["left"].astype(np.intp),
+            nodes["right"].astype(np.intp), nodes["value"], nodes["count"],
+            nodes["is_leaf"].astype(bool), int(nodes["depth"].max())
+        )
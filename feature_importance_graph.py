@@ -1,42 +1,62 @@
-import pandas as pd
+import argparse
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-import joblib
-from sklearn.inspection import permutation_importance
-from sklearn.metrics import r2_score
+from dataset_store import load_dataset
+from features import prepare_features
+from importance_engine import compute_importance, METHODS
+from model_artifact import load_shared
 
 # Loadiong the model and data
 
 model_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\trained_model.joblib"
-data_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\training_data.csv"
+data_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
 
-model = joblib.load(model_path)
-df = pd.read_csv(data_path)
+parser = argparse.ArgumentParser(description="Feature importance chart for the methane model")
+parser.add_argument("--method", choices=METHODS, default="permutation",
+                    help="permutation: R² drop when shuffled; tree_path: exact attribution from the boosted trees")
+parser.add_argument("--repeats", type=int, default=30, help="permutation repeats")
+parser.add_argument("--sample-rows", type=int, default=None, help="stratified subsample per repeat (default: all rows)")
+parser.add_argument("--n-jobs", type=int, default=-1)
+parser.add_argument("--no-cache", action="store_true", help="recompute even if a cached result exists")
+args = parser.parse_args()
+
+model = load_shared(model_path)
+df = load_dataset(data_dir)
 
 # Split features and target
-X = df.drop(columns=["CH4_Yield", "Biogas_Flow"]) 
+X = prepare_features(df, model.feature_names)
 y = df["CH4_Yield"]
 
-# Baseline prediction for reference
-y_pred = model.predict(X)
-print(f"Baseline R² score: {r2_score(y, y_pred):.4f}")
-
-# Compute permutation importance
-result = permutation_importance(model, X, y, n_repeats=30, random_state=42, scoring='r2')
+# Compute importance (cached next to the data, keyed by model + dataset + options)
+cache_dir = None if args.no_cache else os.path.join(data_dir, "importance_cache")
+if args.method == "permutation":
+    options = dict(n_repeats=args.repeats, sample_rows=args.sample_rows, n_jobs=args.n_jobs)
+else:
+    options = dict(n_jobs=args.n_jobs)
+importance_df = compute_importance(model_path, X, y, method=args.method, cache_dir=cache_dir, **options)
+importance_df = importance_df.sort_values(by="Importance", ascending=False)
 
-# Create importance dataframe
-importance_df = pd.DataFrame({
-    'Feature': X.columns,
-    'Importance': result.importances_mean,
-    'Std': result.importances_std
-}).sort_values(by="Importance", ascending=False)
+# Baseline prediction for reference
+if 'baseline_r2' in importance_df.attrs:
+    print(f"Baseline R² score: {importance_df.attrs['baseline_r2']:.4f}")
 
 # Plot
 plt.figure(figsize=(10, 6))
 sns.barplot(data=importance_df, x="Importance", y="Feature", palette="crest", edgecolor='black')
-plt.title("Permutation Feature Importance (Impact on Methane Yield)")
-plt.xlabel("Mean Decrease in R² Score")
+if args.method == "permutation":
+    # Confidence interval over the repeats
+    plt.errorbar(
+        importance_df["Importance"], np.arange(len(importance_df)),
+        xerr=[importance_df["Importance"] - importance_df["CI_Low"], importance_df["CI_High"] - importance_df["Importance"]],
+        fmt="none", ecolor="black", capsize=3
+    )
+    plt.title("Permutation Feature Importance (Impact on Methane Yield)")
+    plt.xlabel("Mean Decrease in R² Score")
+else:
+    plt.title("Tree-Path Feature Attribution (Impact on Methane Yield)")
+    plt.xlabel("Mean |Contribution| to Predicted CH₄ Yield (L/L)")
 plt.grid(True, axis='x', linestyle='--', alpha=0.7)
 plt.tight_layout()
 plt.show()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+
+# Plant constants and derived features, shared by the generator, trainer and every prediction entry point
+
+V_stage1 = 300  # L
+V_stage2 = 700  # L
+VS_in = 25.0    # gVS/L
+
+INPUT_COLUMNS = ['FlowRate', 'Temp1', 'Temp2', 'Agitator1_kW', 'Agitator2_kW', 'Recycle_Ratio', 'PalmFrac', 'SugarIn']
+DERIVED_COLUMNS = ['OLR', 'HRT1', 'HRT2']
+MEASURED_COLUMNS = ['VFA', 'NH3']
+TARGET_COLUMNS = ['CH4_Yield', 'Biogas_Flow']
+
+# What data_trainer.py fits on: everything except the targets
+FEATURE_COLUMNS = INPUT_COLUMNS + DERIVED_COLUMNS + MEASURED_COLUMNS
+
+
+def derived_features(flow):
+    # Works on a scalar, a NumPy array or a pandas Series alike
+    return {
+        'OLR': (flow * VS_in) / (V_stage1 + V_stage2),
+        'HRT1': V_stage1 / flow,
+        'HRT2': V_stage2 / flow,
+    }
+
+
+def feature_names_for(model):
+    names = getattr(model, 'feature_names_in_', None)
+    if names is None:
+        names = getattr(model, 'feature_names', FEATURE_COLUMNS)
+    return list(names)
+
+
+def check_flow(flow):
+    # HRT = V / FlowRate: a stopped or negative flow has no meaningful features
+    if np.any(np.asarray(flow) <= 0):
+        raise ValueError("FlowRate must be positive")
+
+
+def check_columns(available, feature_names):
+    missing = [name for name in feature_names if name not in available]
+    if missing:
+        raise ValueError(f"missing input columns: {missing}")
+
+
+def prepare_features(data, feature_names=FEATURE_COLUMNS):
+    """Derive OLR/HRT1/HRT2 in one vectorized pass and return columns in model order.
+
+    data may be a DataFrame, a dict of scalars (one row) or of arrays, or a list of dicts.
+    Extra columns (e.g. targets or Biogas_Flow) are dropped.
+    """
+    if isinstance(data, dict):
+        data = pd.DataFrame(data, index=[0] if np.isscalar(next(iter(data.values()), 0)) else None)
+    elif not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame(data)
+    check_columns(set(data.columns) | set(DERIVED_COLUMNS), feature_names)
+    flow = data['FlowRate'].astype(float)
+    check_flow(flow)
+    data = data.assign(**derived_features(flow))
+    return data[list(feature_names)]
+
+
+def feature_matrix(data, feature_names=FEATURE_COLUMNS, dtype=np.float32):
+    return prepare_features(data, feature_names).to_numpy(dtype=dtype)
+
+
+def feature_vector(row, feature_names=FEATURE_COLUMNS):
+    # Single-row fast path: plain floats, no DataFrame
+    values = dict(row)
+    check_columns(values, ['FlowRate'])
+    flow = float(values['FlowRate'])
+    check_flow(flow)
+    values.update(derived_features(flow))
+    check_columns(values, feature_names)
+    return [float(values[name]) for name in feature_names]
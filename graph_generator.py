@@ -1,84 +1,26 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import joblib
-from sklearn.inspection import permutation_importance
+import argparse
+from plot_report import PREDICTION_FIGURES, load_plot_data, render_report, show_figures
 
 # loading model and data
 model_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\trained_model.joblib"
-data_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\training_data.csv"
-
-model = joblib.load(model_path)
-df = pd.read_csv(data_path)
-
-# Features and target
-X = df.drop(columns=['CH4_Yield', 'Biogas_Flow'])
-y = df["CH4_Yield"]
-y_pred = model.predict(X)
+data_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
 
+# Figures (defined in plot_report.py; predictions are computed once and shared):
 # 1. Methane Yield vs Temperature (Temp2)
-plt.figure(figsize=(8, 6))
-sns.scatterplot(x=df["Temp2"], y=y_pred)
-plt.title("Methane Yield vs Main Digester Temperature")
-plt.xlabel("Temperature (°C)")
-plt.ylabel("Predicted CH₄ Yield (L/L)")
-plt.grid(True)
-plt.tight_layout()
-plt.show()
-
 # 2. Methane Yield vs OLR
-plt.figure(figsize=(8, 6))
-sns.scatterplot(x=df["OLR"], y=y_pred)
-plt.title("Methane Yield vs OLR")
-plt.xlabel("OLR (gVS/L/day)")
-plt.ylabel("Predicted CH₄ Yield (L/L)")
-plt.grid(True)
-plt.tight_layout()
-plt.show()
-
 # 3. Methane Yield vs HRT2
-plt.figure(figsize=(8, 6))
-sns.scatterplot(x=df["HRT2"], y=y_pred)
-plt.title("Methane Yield vs Main Digester HRT")
-plt.xlabel("HRT2 (days)")
-plt.ylabel("Predicted CH₄ Yield (L/L)")
-plt.grid(True)
-plt.tight_layout()
-plt.show()
-
 # 4. Contour Plot: Temp2 vs PalmFrac
-pivot_df = df.copy()
-pivot_df["Predicted_CH4"] = y_pred
-pivot_table = pivot_df.pivot_table(values="Predicted_CH4", index="PalmFrac", columns="Temp2")
-plt.figure(figsize=(10, 6))
-sns.heatmap(pivot_table, cmap="viridis", annot=True, fmt=".2f")
-plt.title("CH₄ Yield (L/L) vs Temp2 and Palm Oil Fraction")
-plt.xlabel("Temperature (°C)")
-plt.ylabel("Palm Oil Fraction")
-plt.tight_layout()
-plt.show()
-
 # 5. Feature Importance
-importances = model.feature_importances_
-features = X.columns
-sorted_idx = np.argsort(importances)[::-1]
-
-plt.figure(figsize=(10, 6))
-plt.barh(features[sorted_idx], importances[sorted_idx], color="steelblue")
-plt.xlabel("Relative Importance")
-plt.title("Feature Importance (Gradient Boosting)")
-plt.gca().invert_yaxis()
-plt.tight_layout()
-plt.show()
-
 # 6. Actual vs Predicted
-plt.figure(figsize=(8, 6))
-plt.scatter(y, y_pred, alpha=0.6)
-plt.plot([min(y), max(y)], [min(y), max(y)], 'r--')
-plt.xlabel("Actual CH₄ Yield (L/L)")
-plt.ylabel("Predicted CH₄ Yield (L/L)")
-plt.title("Predicted vs Actual Methane Yield")
-plt.grid(True)
-plt.tight_layout()
-plt.show()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model prediction charts")
+    parser.add_argument("--report", default=None, metavar="DIR",
+                        help="render every figure to DIR headless and in parallel instead of showing them")
+    parser.add_argument("--format", nargs="+", choices=["png", "svg", "pdf"], default=["png"])
+    args = parser.parse_args()
+
+    if args.report:
+        render_report(model_path, data_dir, args.report, PREDICTION_FIGURES, args.format)
+    else:
+        show_figures(PREDICTION_FIGURES, load_plot_data(model_path, data_dir))
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import stats
+
+from model_artifact import load_shared
+
+
+# Feature importance for the methane model, cheap enough to regenerate with every chart:
+#   permutation  R² drop when one column is shuffled; features run in a joblib pool, each
+#                repeat can use its own stratified subsample, and t-based confidence
+#                intervals come from the spread over repeats
+#   tree_path    exact per-row attribution read off the boosted trees: every split passes the
+#                change in node mean to its feature, so bias + contributions == prediction
+# Results are cached as JSON, keyed by the model artifact bytes, the dataset contents and the options.
+
+METHODS = ("permutation", "tree_path")
+
+
+def r2(y, y_pred):
+    return 1.0 - np.sum((y - y_pred) ** 2) / np.sum((y - y.mean()) ** 2)
+
+
+# Permutation importance
+
+def stratified_sample(y, n_rows, n_strata=10, seed=42):
+    # Equal-frequency bins of the target, sampled proportionally, so the high-yield tail stays represented
+    rng = np.random.default_rng(seed)
+    edges = np.quantile(y, np.linspace(0, 1, n_strata + 1)[1:-1])
+    strata = np.searchsorted(edges, y, side="right")
+    picked = []
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        k = min(len(members), max(1, round(n_rows * len(members) / len(y))))
+        picked.append(rng.choice(members, size=k, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def permute_feature(ensemble, X, y, column, samples, baselines, seed):
+    rng = np.random.default_rng([seed, column])
+    drops = np.empty(len(baselines))
+    for r, baseline in enumerate(baselines):
+        rows = samples[r] if samples is not None else slice(None)
+        X_perm = X[rows].copy()
+        y_rows = y[rows]
+        X_perm[:, column] = X_perm[rng.permutation(len(X_perm)), column]
+        drops[r] = baseline - r2(y_rows, ensemble.predict(X_perm))
+    return drops
+
+
+def permutation_importance(ensemble, X, y, n_repeats=30, n_jobs=-1, sample_rows=None, seed=42, confidence=0.95):
+    X = np.ascontiguousarray(X, dtype=ensemble.dtype)
+    y = np.asarray(y, dtype=np.float64)
+
+    if sample_rows and sample_rows < len(X):
+        # A fresh stratified subsample per repeat, shared by all features so their drops stay paired
+        samples = [stratified_sample(y, sample_rows, seed=seed + r) for r in range(n_repeats)]
+        baselines = [r2(y[rows], ensemble.predict(X[rows])) for rows in samples]
+        n_rows = len(samples[0])
+    else:
+        samples = None
+        baselines = [r2(y, ensemble.predict(X))] * n_repeats
+        n_rows = len(X)
+
+    drops = np.array(Parallel(n_jobs=n_jobs)(
+        delayed(permute_feature)(ensemble, X, y, column, samples, baselines, seed)
+        for column in range(X.shape[1])
+    ))
+    mean = drops.mean(axis=1)
+    std = drops.std(axis=1, ddof=1) if n_repeats > 1 else np.zeros(len(mean))
+    half_width = stats.t.ppf((1 + confidence) / 2, max(n_repeats - 1, 1)) * std / np.sqrt(n_repeats)
+    table = pd.DataFrame({
+        'Feature': ensemble.feature_names,
+        'Importance': mean,
+        'Std': std,
+        'CI_Low': mean - half_width,
+        'CI_High': mean + half_width,
+    })
+    meta = {'baseline_r2': float(np.mean(baselines)), 'rows': n_rows, 'repeats': n_repeats, 'confidence': confidence}
+    return table, meta
+
+
+# Tree-path attribution
+
+def node_means(ensemble):
+    # Mean leaf value under every node, weighted by training samples per node
+    if ensemble.count is None:
+        raise ValueError("these tree arrays carry no node counts; re-export them with TreeEnsemble.from_model")
+    left, right, count = ensemble.left, ensemble.right, ensemble.count
+    means = ensemble.value.astype(np.float64)
+    internal = np.flatnonzero(left != np.arange(len(left)))
+    # Children are always numbered after their parent, so one reverse sweep fills every internal node
+    for node in internal[::-1]:
+        l, r = left[node], right[node]
+        means[node] = (means[l] * count[l] + means[r] * count[r]) / (count[l] + count[r])
+    return means
+
+
+def tree_path_attribution(ensemble, X, batch_rows=256):
+    means = node_means(ensemble)
+    X = np.asarray(X, dtype=ensemble.dtype)
+    n_features = X.shape[1]
+    bias = ensemble.baseline + means.take(ensemble.roots).sum()
+    out = np.empty((len(X), n_features))
+    for start in range(0, len(X), batch_rows):
+        block = X[start:start + batch_rows]
+        n = len(block)
+        flat = block.ravel()
+        row_offsets = (np.arange(n) * n_features)[:, None]
+        nodes = np.broadcast_to(ensemble.roots, (n, len(ensemble.roots)))
+        contrib = np.zeros(n * n_features)
+        # Same lock-step walk as TreeEnsemble.predict; leaves loop onto themselves and add nothing
+        for _ in range(ensemble.max_depth):
+            split = row_offsets + ensemble.feature.take(nodes)
+            go_right = flat.take(split) > ensemble.threshold.take(nodes)
+            next_nodes = ensemble.children.take(2 * nodes + go_right)
+            contrib += np.bincount(
+                split.ravel(), weights=(means.take(next_nodes) - means.take(nodes)).ravel(), minlength=n * n_features
+            )
+            nodes = next_nodes
+        out[start:start + n] = contrib.reshape(n, n_features)
+    return out, bias
+
+
+def tree_path_importance(ensemble, X, y=None, n_jobs=-1, batch_rows=256):
+    X = np.ascontiguousarray(X, dtype=ensemble.dtype)
+    blocks = np.array_split(np.arange(len(X)), max(1, min(len(X) // 4096, 64)))
+    parts = Parallel(n_jobs=n_jobs)(
+        delayed(tree_path_attribution)(ensemble, X[rows], batch_rows) for rows in blocks
+    )
+    attributions = np.concatenate([p[0] for p in parts])
+    table = pd.DataFrame({
+        'Feature': ensemble.feature_names,
+        'Importance': np.abs(attributions).mean(axis=0),
+        'Mean_Contribution': attributions.mean(axis=0),
+    })
+    meta = {'bias': float(parts[0][1]), 'rows': len(X)}
+    return table, meta
+
+
+# Disk cache
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(X, y):
+    digest = hashlib.sha256()
+    X = np.ascontiguousarray(X)
+    digest.update(repr((X.shape, X.dtype.str, list(getattr(X, "columns", [])))).encode())
+    digest.update(X.tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def compute_importance(model_path, X, y, method="permutation", cache_dir=None, **options):
+    if method not in METHODS:
+        raise ValueError(f"unknown importance method {method!r}; choose from {METHODS}")
+    cache_path = None
+    if cache_dir:
+        key = hashlib.sha256(json.dumps({
+            'model': file_hash(model_path),
+            'data': dataset_fingerprint(X, y),
+            'method': method,
+            'options': {k: v for k, v in options.items() if k != 'n_jobs'},
+        }, sort_keys=True).encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{method}-{key[:20]}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            table = pd.DataFrame(cached['table'])
+            table.attrs = cached['meta']
+            return table
+
+    start = time.perf_counter()
+    ensemble = load_shared(model_path)
+    if method == "permutation":
+        table, meta = permutation_importance(ensemble, X, y, **options)
+    else:
+        table, meta = tree_path_importance(ensemble, X, y, **options)
+    meta['seconds'] = time.perf_counter() - start
+    table.attrs = meta
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'table': table.to_dict(orient="list"), 'meta': meta}, f)
+        os.replace(tmp_path, cache_path)
+    return table
@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+
+from fast_predictor import TreeEnsemble
+
+
+# Shared model artifact. joblib.load gives every process its own unpickled copy of the trees;
+# here the flattened node arrays are stored as plain .npy files and memory-mapped read-only,
+# so all processes on a host share one physical copy through the page cache, and a new process
+# is ready to predict after reading a small meta.json (schema + metadata) and mapping the files.
+#
+#   <model>.shared/CURRENT          {"version": ...}: the version servers should use
+#   <model>.shared/<version>/*.npy  one file per node array
+#   <model>.shared/<version>/meta.json
+#
+# Publishing writes a complete new version directory and then atomically replaces CURRENT, so a
+# retrain can swap the model under running servers: SharedModel notices the new pointer and maps
+# the new version, while calls already in flight finish on the old mapping.
+
+ARTIFACT_SUFFIX = ".shared"
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'children', 'count')
+
+
+def artifact_dir_for(model_path):
+    if os.path.isdir(model_path):
+        return model_path
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+
+def source_stamp(path):
+    # Size + mtime is enough to tell a retrained joblib file apart without reading it
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def publish(ensemble, artifact_dir, source=None, model_class=None, keep=2):
+    """Write the ensemble as a new version and point CURRENT at it. Returns the version name."""
+    os.makedirs(artifact_dir, exist_ok=True)
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    tmp_dir = os.path.join(artifact_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    for name in ARRAYS:
+        array = getattr(ensemble, name)
+        if array is not None:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    meta = {
+        'version': version,
+        'feature_names': ensemble.feature_names,
+        'dtype': ensemble.dtype.str,
+        'baseline': ensemble.baseline,
+        'max_depth': ensemble.max_depth,
+        'n_trees': len(ensemble.roots),
+        'n_nodes': len(ensemble.feature),
+        'model_class': model_class,
+        'source': source,
+        'created': time.time(),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_dir, os.path.join(artifact_dir, version))
+
+    pointer = os.path.join(artifact_dir, "CURRENT")
+    with open(pointer + f".{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump({'version': version}, f)
+    os.replace(pointer + f".{os.getpid()}.tmp", pointer)
+    prune(artifact_dir, keep)
+    return version
+
+
+def prune(artifact_dir, keep=2):
+    # Old versions go once newer ones exist. Processes still mapping them keep working on POSIX;
+    # where the OS refuses to delete mapped files (Windows), they are retried on the next publish.
+    current = current_version(artifact_dir)
+    versions = sorted((d for d in os.listdir(artifact_dir) if d.startswith("v")), key=version_time)
+    for version in versions[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(artifact_dir, version), ignore_errors=True)
+
+
+def version_time(version):
+    return int(version[1:].split("-")[0])
+
+
+def current_version(artifact_dir):
+    with open(os.path.join(artifact_dir, "CURRENT"), encoding="utf-8") as f:
+        return json.load(f)['version']
+
+
+def read_meta(artifact_dir, version=None):
+    version = version or current_version(artifact_dir)
+    with open(os.path.join(artifact_dir, version, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_artifact(artifact_dir, version=None):
+    """Map one version (default: CURRENT) read-only as a TreeEnsemble; .version and .meta are set on it."""
+    meta = read_meta(artifact_dir, version)
+    root = os.path.join(artifact_dir, meta['version'])
+    arrays = {}
+    for name in ARRAYS:
+        path = os.path.join(root, f"{name}.npy")
+        # Plain ndarray views of the maps: no copy, and no np.memmap overhead on every take()
+        arrays[name] = np.asarray(np.load(path, mmap_mode="r")) if os.path.exists(path) else None
+    ensemble = TreeEnsemble(
+        arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'], arrays['roots'],
+        meta['baseline'], meta['max_depth'], meta['feature_names'], meta['dtype'], arrays['count'], arrays['children']
+    )
+    ensemble.version = meta['version']
+    ensemble.meta = meta
+    return ensemble
+
+
+def export_artifact(model_path, artifact_dir=None, model=None, keep=2):
+    # Flatten a trained joblib model and publish it as the current shared version
+    model = model if model is not None else joblib.load(model_path)
+    return publish(TreeEnsemble.from_model(model), artifact_dir or artifact_dir_for(model_path),
+                   source=source_stamp(model_path), model_class=type(model).__name__, keep=keep)
+
+
+def is_stale(model_path, artifact_dir):
+    if not os.path.exists(os.path.join(artifact_dir, "CURRENT")):
+        return True
+    if os.path.isdir(model_path) or not os.path.exists(model_path):
+        return False
+    source = read_meta(artifact_dir).get('source') or {}
+    stamp = source_stamp(model_path)
+    return (source.get('size'), source.get('mtime_ns')) != (stamp['size'], stamp['mtime_ns'])
+
+
+def load_shared(model_path):
+    """Load a model as a shared, memory-mapped TreeEnsemble.
+
+    model_path is a trained .joblib file or an artifact directory. A .joblib file is exported
+    to <model>.shared on first use, and re-exported if it changed since; every later process
+    maps that artifact instead of unpickling the model.
+    """
+    artifact_dir = artifact_dir_for(model_path)
+    if is_stale(model_path, artifact_dir):
+        export_artifact(model_path, artifact_dir)
+    return load_artifact(artifact_dir)
+
+
+class SharedModel:
+    # Follows CURRENT for long-running servers: get() re-checks the pointer at most every
+    # check_interval seconds (one stat) and maps the new version when it has moved
+    def __init__(self, model_path, check_interval=1.0):
+        self.artifact_dir = artifact_dir_for(model_path)
+        self.ensemble = load_shared(model_path)
+        self.check_interval = check_interval
+        self.checked_at = time.monotonic()
+        self.pointer_mtime = os.stat(os.path.join(self.artifact_dir, "CURRENT")).st_mtime_ns
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at >= self.check_interval:
+            self.checked_at = now
+            try:
+                mtime = os.stat(os.path.join(self.artifact_dir, "CURRENT")).st_mtime_ns
+                if mtime != self.pointer_mtime:
+                    if current_version(self.artifact_dir) != self.ensemble.version:
+                        self.ensemble = load_artifact(self.artifact_dir)
+                    self.pointer_mtime = mtime
+            except (OSError, ValueError):
+                # Caught between two publishes, or the artifact was removed: keep serving what is mapped
+                pass
+        return self.ensemble
+
+    @property
+    def version(self):
+        return self.ensemble.version
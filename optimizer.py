@@ -0,0 +1,211 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+from data_generator import SCENARIO_BOUNDS, SCENARIO_FIELDS, simulate_two_stage_system
+from dataset_store import load_dataset
+from features import prepare_features, feature_names_for
+
+
+# Operating-point optimizer over the trained surrogate.
+# An evolutionary search: a Sobol first generation, then each generation mutates the elite
+# with Gaussian steps shaped by the elite's own spread. Every generation is one vectorized
+# predict over thousands of candidates. Constraints use Deb's rule: a feasible candidate beats
+# any infeasible one, and infeasible ones rank by total violation, so no penalty weights to tune.
+# The best candidates can be re-checked against the mechanistic model in a process pool.
+
+model_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\trained_model.joblib"
+data_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
+
+# What operators can set; SugarIn (feed), VFA and NH3 (measured) are held at their current values
+DECISION_FIELDS = ['FlowRate', 'Temp1', 'Temp2', 'Agitator1_kW', 'Agitator2_kW', 'Recycle_Ratio', 'PalmFrac']
+CONTEXT_FIELDS = ['SugarIn', 'VFA', 'NH3']
+OBJECTIVES = ("yield", "production")
+
+
+def dataset_context(data_dir):
+    # Training-set medians for whatever context the caller does not know. Constants would put
+    # every candidate off the training distribution: simulated VFA/NH3 sit orders of magnitude
+    # below the dashboard's 0.05 defaults.
+    return load_dataset(data_dir, columns=CONTEXT_FIELDS)[CONTEXT_FIELDS].median().astype(float).to_dict()
+
+
+def agitator_budget(max_kw):
+    # Constraint: total agitator power at or below max_kw. Returns the violation per candidate
+    def violation(df):
+        return np.maximum(df['Agitator1_kW'] + df['Agitator2_kW'] - max_kw, 0.0)
+    return violation
+
+
+def min_flow(min_flow_rate):
+    def violation(df):
+        return np.maximum(min_flow_rate - df['FlowRate'], 0.0)
+    return violation
+
+
+class SurrogateObjective:
+    def __init__(self, model, context, fixed=None, bounds=None, constraints=(), objective="yield"):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}, got {objective!r}")
+        missing = [name for name in CONTEXT_FIELDS if name not in context]
+        if missing:
+            raise ValueError(f"context is missing {missing}; see dataset_context()")
+        self.model = model
+        self.feature_names = feature_names_for(model)
+        self.context = dict(context)
+        self.fixed = dict(fixed or {})
+        self.variables = [f for f in DECISION_FIELDS if f not in self.fixed]
+        bounds = dict(SCENARIO_BOUNDS, **(bounds or {}))
+        self.lower = np.array([bounds[f][0] for f in self.variables], dtype=float)
+        self.upper = np.array([bounds[f][1] for f in self.variables], dtype=float)
+        self.constraints = list(constraints)
+        self.objective = objective
+        self.evaluations = 0
+
+    def frame(self, points):
+        df = pd.DataFrame(points, columns=self.variables)
+        for name, value in {**self.context, **self.fixed}.items():
+            df[name] = value
+        return df[list(SCENARIO_FIELDS) + ['VFA', 'NH3']]
+
+    def __call__(self, points):
+        df = self.frame(points)
+        y = self.model.predict(prepare_features(df, self.feature_names))
+        self.evaluations += len(df)
+        score = y * df['FlowRate'].to_numpy() if self.objective == "production" else y
+        violation = np.zeros(len(df))
+        for constraint in self.constraints:
+            violation += np.asarray(constraint(df), dtype=float)
+        return y, score, violation
+
+
+def rank(score, violation):
+    # Deb's rule: least violation first, then highest score
+    return np.lexsort((-score, violation))
+
+
+def optimize(objective, population=4096, generations=20, elite_frac=0.02, top=10, seed=42, tol=1e-7, patience=4):
+    rng = np.random.default_rng(seed)
+    d = len(objective.variables)
+    span = objective.upper - objective.lower
+    n_elite = max(int(population * elite_frac), 4)
+
+    m = int(np.ceil(np.log2(population)))
+    unit = qmc.Sobol(d=d, scramble=True, seed=seed).random_base2(m)[:population]
+    pop = qmc.scale(unit, objective.lower, objective.upper)
+
+    archive_x, archive = [], []
+    best, stale = -np.inf, 0
+    for generation in range(generations):
+        y, score, violation = objective(pop)
+        order = rank(score, violation)
+        elite = pop[order[:n_elite]]
+        archive_x.append(elite)
+        archive.append(np.column_stack([y[order[:n_elite]], score[order[:n_elite]], violation[order[:n_elite]]]))
+
+        lead = score[order[0]] if violation[order[0]] == 0 else -np.inf
+        stale = stale + 1 if lead <= best + tol else 0
+        best = max(best, lead)
+        if stale >= patience:
+            break
+
+        # Offspring: Gaussian steps around randomly chosen elites, scaled by the elite spread
+        sigma = np.maximum(elite.std(axis=0), 1e-3 * span)
+        parents = elite[rng.integers(0, n_elite, population - n_elite)]
+        children = np.clip(parents + rng.normal(0.0, 1.0, parents.shape) * sigma, objective.lower, objective.upper)
+        pop = np.vstack([elite, children])
+
+    X = np.vstack(archive_x)
+    stats = np.vstack(archive)
+    result = objective.frame(X)
+    result['Predicted_CH4_Yield'] = stats[:, 0]
+    result['Score'] = stats[:, 1]
+    result['Violation'] = stats[:, 2]
+    result = result.iloc[rank(stats[:, 1], stats[:, 2])]
+    # Near-duplicate elites survive across generations; keep distinct operating points only
+    result = result.loc[~result[objective.variables].round(3).duplicated()]
+    result.attrs = {'generations': generation + 1, 'evaluations': objective.evaluations}
+    return result.head(top).reset_index(drop=True)
+
+
+# Re-check against the ADM1 model, one process per candidate
+
+def simulate_candidate(scenario):
+    return simulate_two_stage_system(*scenario)
+
+
+def recheck(candidates, workers=None):
+    scenarios = [tuple(float(row[f]) for f in SCENARIO_FIELDS) for _, row in candidates.iterrows()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(simulate_candidate, scenarios))
+    checked = candidates.copy()
+    checked['Simulated_CH4_Yield'] = [r['CH4_Yield'] for r in results]
+    checked['Simulated_VFA'] = [r.get('Final_VFA', np.nan) for r in results]
+    checked['Simulated_NH3'] = [r.get('Final_NH3', np.nan) for r in results]
+    return checked
+
+
+def optimize_operating_point(model, context=None, fixed=None, max_agitator_kw=None, min_flow_rate=None,
+                             objective="yield", top=10, seed=42, data_dir=data_dir, **search):
+    # Context fields left out (or None) default to the training-set medians
+    context = {k: v for k, v in (context or {}).items() if v is not None}
+    if any(name not in context for name in CONTEXT_FIELDS):
+        context = dict(dataset_context(data_dir), **context)
+    constraints = []
+    if max_agitator_kw is not None:
+        constraints.append(agitator_budget(max_agitator_kw))
+    if min_flow_rate is not None:
+        constraints.append(min_flow(min_flow_rate))
+    surrogate = SurrogateObjective(model, context, fixed=fixed, constraints=constraints, objective=objective)
+    return optimize(surrogate, top=top, seed=seed, **search)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the surrogate model for the best operating point")
+    parser.add_argument("--model", default=model_path)
+    parser.add_argument("--objective", choices=OBJECTIVES, default="yield",
+                        help="yield: L CH4/L; production: yield x FlowRate")
+    parser.add_argument("--max-agitator-kw", type=float, default=None, help="budget for Agitator1_kW + Agitator2_kW")
+    parser.add_argument("--min-flow", type=float, default=None, help="lowest acceptable FlowRate (L/day)")
+    parser.add_argument("--fix", nargs="+", default=[], metavar="NAME=VALUE", help="hold decision variables fixed")
+    for name in CONTEXT_FIELDS:
+        parser.add_argument(f"--{name.lower()}", type=float, default=None,
+                            help=f"current {name}, held fixed (default: training-set median)")
+    parser.add_argument("--data-dir", default=data_dir, help="dataset the context medians come from")
+    parser.add_argument("--population", type=int, default=4096)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--recheck", action="store_true", help="simulate the top candidates with the ADM1 model")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the candidates to this CSV")
+    args = parser.parse_args()
+
+    fixed = {}
+    for item in args.fix:
+        name, _, value = item.partition("=")
+        if name not in DECISION_FIELDS:
+            parser.error(f"--fix: {name!r} is not one of {DECISION_FIELDS}")
+        fixed[name] = float(value)
+
+    start = time.perf_counter()
+    model = joblib.load(args.model)
+    best = optimize_operating_point(
+        model, context={name: getattr(args, name.lower()) for name in CONTEXT_FIELDS}, fixed=fixed,
+        max_agitator_kw=args.max_agitator_kw, min_flow_rate=args.min_flow, objective=args.objective,
+        top=args.top, seed=args.seed, data_dir=args.data_dir, population=args.population, generations=args.generations
+    )
+    print(f" {best.attrs['evaluations']} candidates over {best.attrs['generations']} generations "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.recheck:
+        start = time.perf_counter()
+        best = recheck(best, workers=args.workers)
+        print(f" Re-checked {len(best)} candidates against the ADM1 model in {time.perf_counter() - start:.2f}s")
+    print(best.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    if args.output:
+        best.to_csv(args.output, index=False)
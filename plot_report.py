@@ -0,0 +1,276 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from scipy.ndimage import gaussian_filter
+
+from dataset_store import load_dataset
+from fast_predictor import TreeEnsemble
+from features import prepare_features, feature_names_for
+
+
+# Chart pack for graph_generator.py and greaph2_generator.py.
+# Every figure is drawn from aggregates (hexbins, binned means, a histogram-smoothed KDE), never
+# from raw point sets, so drawing time does not grow with the dataset. In report mode the
+# predictions are computed once, the columns are written to a scratch dir as .npy, and a
+# process pool renders the figures headless, each worker memory-mapping just the columns it needs.
+
+model_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\trained_model.joblib"
+data_dir = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data"
+
+OVERLAY_POINTS = 2000
+
+
+# Shared data: dataset columns, the model's predictions and its feature importances
+
+def load_plot_data(model_path, data_dir):
+    model = joblib.load(model_path)
+    df = load_dataset(data_dir)
+    X = prepare_features(df, feature_names_for(model))
+
+    data = {name: df[name].to_numpy() for name in df.columns}
+    # One bulk predict for every figure (scikit-learn's compiled path is fastest for whole datasets)
+    data['Predicted_CH4'] = model.predict(X)
+    importances = getattr(model, "feature_importances_", None)
+    if importances is None:
+        # HistGradientBoosting has no impurity importances; use the exact tree-path attribution
+        from importance_engine import tree_path_importance
+        table, _ = tree_path_importance(TreeEnsemble.from_model(model), X)
+        importances = table['Importance'].to_numpy()
+        importances = importances / importances.sum()
+    data['importance_names'] = np.array(X.columns, dtype=str)
+    data['importance_values'] = np.asarray(importances, dtype=np.float64)
+    return data
+
+
+def overlay_sample(n, k=OVERLAY_POINTS, seed=0):
+    if n <= k:
+        return slice(None)
+    return np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
+
+
+def grid_kde(x, y, gridsize=200, cut=3):
+    # 2-D histogram smoothed with a Gaussian of Scott's bandwidth: O(n) binning plus a
+    # fixed-size filter, instead of a kernel per data point
+    n = len(x)
+    ranges, sigmas = [], []
+    for v in (x, y):
+        bw = np.std(v) * n ** (-1 / 6)
+        if bw == 0:
+            bw = max(abs(float(v[0])) * 0.01, 1e-3)
+        ranges.append((v.min() - cut * bw, v.max() + cut * bw))
+        sigmas.append(bw / ((ranges[-1][1] - ranges[-1][0]) / gridsize))
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=gridsize, range=ranges)
+    density = gaussian_filter(counts, sigma=sigmas, mode="constant")
+    density /= n * np.diff(x_edges)[0] * np.diff(y_edges)[0]
+    return (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2, density
+
+
+def bin_index(x, n_bins=30):
+    # Grid axes have a handful of levels: one bin per level. Continuous axes: quantile bins.
+    if len(np.unique(x[overlay_sample(len(x), 100_000)])) <= n_bins:
+        levels = np.unique(x)
+        return np.searchsorted(levels, x), len(levels)
+    edges = np.quantile(x, np.linspace(0, 1, n_bins + 1))
+    return np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_bins - 1), n_bins
+
+
+def binned_mean(x, y, n_bins=30):
+    idx, _ = bin_index(x, n_bins)
+    counts = np.bincount(idx)
+    keep = counts > 0
+    x_means = np.bincount(idx, weights=x)[keep] / counts[keep]
+    y_means = np.bincount(idx, weights=y)[keep] / counts[keep]
+    return x_means, y_means
+
+
+# Figures: each takes the shared data dict and returns a matplotlib Figure
+
+def plot_prediction_hexbin(data, x, xlabel, title):
+    fig, ax = plt.subplots(figsize=(8, 6))
+    hb = ax.hexbin(data[x], data['Predicted_CH4'], gridsize=60, bins="log", cmap="Blues", mincnt=1)
+    fig.colorbar(hb, ax=ax, label="Rows (log)")
+    # Binned mean on top, so the trend reads as clearly as in the old scatter
+    x_values, means = binned_mean(np.asarray(data[x]), np.asarray(data['Predicted_CH4']))
+    ax.plot(x_values, means, "r-o", linewidth=2, markersize=4, label="Binned mean")
+    ax.legend()
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Predicted CH₄ Yield (L/L)")
+    ax.grid(True)
+    fig.tight_layout()
+    return fig
+
+
+def plot_temp2_palm_heatmap(data, n_bins=15):
+    import seaborn as sns
+    # Bin both axes like binned_mean, so continuous (LHS/Sobol) data gives a filled grid, not one cell per row
+    temp2, palm = np.asarray(data['Temp2']), np.asarray(data['PalmFrac'])
+    ix, nx = bin_index(temp2, n_bins)
+    iy, ny = bin_index(palm, n_bins)
+    cell = iy * nx + ix
+    counts = np.bincount(cell, minlength=nx * ny)
+    with np.errstate(invalid="ignore"):
+        means = np.bincount(cell, weights=np.asarray(data['Predicted_CH4']), minlength=nx * ny) / counts
+    # Label each bin by the mean of the values in it
+    x_labels = np.bincount(ix, weights=temp2, minlength=nx) / np.maximum(np.bincount(ix, minlength=nx), 1)
+    y_labels = np.bincount(iy, weights=palm, minlength=ny) / np.maximum(np.bincount(iy, minlength=ny), 1)
+    pivot_table = pd.DataFrame(means.reshape(ny, nx), index=np.round(y_labels, 2), columns=np.round(x_labels, 1))
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.heatmap(pivot_table, cmap="viridis", annot=pivot_table.size <= 200, fmt=".2f", ax=ax)
+    ax.set_title("CH₄ Yield (L/L) vs Temp2 and Palm Oil Fraction")
+    ax.set_xlabel("Temperature (°C)")
+    ax.set_ylabel("Palm Oil Fraction")
+    fig.tight_layout()
+    return fig
+
+
+def plot_feature_importance(data):
+    names, importances = data['importance_names'], data['importance_values']
+    sorted_idx = np.argsort(importances)[::-1]
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.barh(names[sorted_idx], importances[sorted_idx], color="steelblue")
+    ax.set_xlabel("Relative Importance")
+    ax.set_title("Feature Importance (Gradient Boosting)")
+    ax.invert_yaxis()
+    fig.tight_layout()
+    return fig
+
+
+def plot_actual_vs_predicted(data):
+    y, y_pred = data['CH4_Yield'], data['Predicted_CH4']
+    fig, ax = plt.subplots(figsize=(8, 6))
+    hb = ax.hexbin(y, y_pred, gridsize=80, bins="log", cmap="viridis", mincnt=1)
+    fig.colorbar(hb, ax=ax, label="Rows (log)")
+    ax.plot([y.min(), y.max()], [y.min(), y.max()], 'r--')
+    ax.set_xlabel("Actual CH₄ Yield (L/L)")
+    ax.set_ylabel("Predicted CH₄ Yield (L/L)")
+    ax.set_title("Predicted vs Actual Methane Yield")
+    ax.grid(True)
+    fig.tight_layout()
+    return fig
+
+
+def plot_density_contour(data, x, y, xlabel, ylabel, title, cmap='viridis'):
+    xs, ys, density = grid_kde(np.asarray(data[x], dtype=np.float64), np.asarray(data[y], dtype=np.float64))
+    fig, ax = plt.subplots(figsize=(10, 6))
+    levels = np.linspace(density.max() * 0.05, density.max(), 10)
+    contour = ax.contourf(xs, ys, density.T, levels=levels, cmap=cmap, extend="neither")
+    fig.colorbar(contour, ax=ax, label="Density")
+    sample = overlay_sample(len(data[x]))
+    ax.scatter(data[x][sample], data[y][sample], color='white', s=5, alpha=0.3)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True)
+    fig.tight_layout()
+    return fig
+
+
+# name -> (function, keyword arguments, columns it reads)
+PREDICTION_FIGURES = {
+    'yield_vs_temp2': (plot_prediction_hexbin, dict(
+        x="Temp2", xlabel="Temperature (°C)", title="Methane Yield vs Main Digester Temperature"), ['Temp2', 'Predicted_CH4']),
+    'yield_vs_olr': (plot_prediction_hexbin, dict(
+        x="OLR", xlabel="OLR (gVS/L/day)", title="Methane Yield vs OLR"), ['OLR', 'Predicted_CH4']),
+    'yield_vs_hrt2': (plot_prediction_hexbin, dict(
+        x="HRT2", xlabel="HRT2 (days)", title="Methane Yield vs Main Digester HRT"), ['HRT2', 'Predicted_CH4']),
+    'temp2_palm_heatmap': (plot_temp2_palm_heatmap, {}, ['Temp2', 'PalmFrac', 'Predicted_CH4']),
+    'feature_importance': (plot_feature_importance, {}, ['importance_names', 'importance_values']),
+    'actual_vs_predicted': (plot_actual_vs_predicted, {}, ['CH4_Yield', 'Predicted_CH4']),
+}
+
+DENSITY_YIELD = dict(y='CH4_Yield', ylabel='Methane Yield (L CH₄/L)')
+DENSITY_FIGURES = {
+    'density_temp2': (plot_density_contour, dict(
+        x='Temp2', xlabel='Temperature Stage 2 (°C)', title='Temperature (Stage 2) vs Methane Yield', **DENSITY_YIELD),
+        ['Temp2', 'CH4_Yield']),
+    'density_olr': (plot_density_contour, dict(
+        x='OLR', xlabel='Organic Loading Rate (gVS/L/day)', title='OLR vs Methane Yield', **DENSITY_YIELD),
+        ['OLR', 'CH4_Yield']),
+    'density_hrt2': (plot_density_contour, dict(
+        x='HRT2', xlabel='HRT Stage 2 (days)', title='Retention Time (Stage 2) vs Methane Yield', **DENSITY_YIELD),
+        ['HRT2', 'CH4_Yield']),
+    'density_biogas_flow': (plot_density_contour, dict(
+        x='Biogas_Flow', xlabel='Biogas Flow (Nm³/h)', title='Biogas Flow vs Methane Yield', **DENSITY_YIELD),
+        ['Biogas_Flow', 'CH4_Yield']),
+    'density_palmfrac': (plot_density_contour, dict(
+        x='PalmFrac', xlabel='Palm Oil Co-substrate Fraction', title='Palm Oil Fraction vs Methane Yield', **DENSITY_YIELD),
+        ['PalmFrac', 'CH4_Yield']),
+    'density_recycle_ratio': (plot_density_contour, dict(
+        x='Recycle_Ratio', xlabel='Recycle Ratio', title='Recycle Ratio vs Methane Yield', **DENSITY_YIELD),
+        ['Recycle_Ratio', 'CH4_Yield']),
+}
+
+FIGURES = {**PREDICTION_FIGURES, **DENSITY_FIGURES}
+
+
+def draw(name, data):
+    function, kwargs, _ = FIGURES[name]
+    return function(data, **kwargs)
+
+
+def show_figures(names, data):
+    # Interactive use: one window after another, as the original scripts did
+    for name in names:
+        draw(name, data)
+        plt.show()
+
+
+# Report mode
+
+def render_figure(name, scratch_dir, out_dir, formats):
+    plt.switch_backend("Agg")
+    start = time.perf_counter()
+    _, _, columns = FIGURES[name]
+    data = {c: np.load(os.path.join(scratch_dir, f"{c}.npy"), mmap_mode="r") for c in columns}
+    fig = draw(name, data)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        fig.savefig(path, dpi=150)
+        paths.append(path)
+    plt.close(fig)
+    return name, paths, time.perf_counter() - start
+
+
+def render_report(model_path, data_dir, out_dir, names=None, formats=("png",), workers=None):
+    names = list(names or FIGURES)
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    data = load_plot_data(model_path, data_dir)
+    print(f" Loaded {len(data['Predicted_CH4'])} rows and predicted them in {time.perf_counter() - start:.2f}s")
+
+    scratch_dir = tempfile.mkdtemp(prefix=".plot-data-", dir=out_dir)
+    try:
+        needed = {c for name in names for c in FIGURES[name][2]}
+        for column in needed:
+            np.save(os.path.join(scratch_dir, f"{column}.npy"), data[column])
+        del data
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_figure, name, scratch_dir, out_dir, formats) for name in names]
+            for future in as_completed(futures):
+                name, paths, seconds = future.result()
+                print(f"   {name:<24} {seconds:6.2f}s  -> {', '.join(paths)}")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    print(f" Rendered {len(names)} figures in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the chart pack to image files, headless and in parallel")
+    parser.add_argument("--model", default=model_path)
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--output-dir", default=os.path.join(data_dir, "report"))
+    parser.add_argument("--format", nargs="+", choices=["png", "svg", "pdf"], default=["png"])
+    parser.add_argument("--figures", nargs="+", choices=list(FIGURES), default=None, help="subset to render (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    args = parser.parse_args()
+    render_report(args.model, args.data_dir, args.output_dir, args.figures, args.format, args.workers)
@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+import backend
+from features import feature_vector
+
+
+# Micro-batching: concurrent requests queue up, and one task drains them into batches of
+# up to max_batch rows (waiting at most max_wait for stragglers) for a single vectorized predict
+
+class MicroBatcher:
+    def __init__(self, max_batch=256, max_wait=0.002):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.stats = ServerStats()
+
+    async def predict(self, vector):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((vector, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            X = np.array([vector for vector, _, _ in batch], dtype=backend.get_fast_model().dtype)
+            try:
+                # Off the event loop so sockets keep being served while the batch runs
+                predictions = await loop.run_in_executor(None, backend.predict_methane_yield_batch, X)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            for (_, future, queued_at), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(float(prediction))
+                self.stats.record(now - queued_at)
+            self.stats.batches += 1
+
+
+class ServerStats:
+    def __init__(self, window=10_000):
+        self.latencies = deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+
+    def record(self, latency):
+        self.latencies.append(latency)
+        self.requests += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'throughput_rps': self.requests / elapsed if elapsed > 0 else 0.0,
+            'latency_p50_ms': float(np.percentile(lat, 50)),
+            'latency_p99_ms': float(np.percentile(lat, 99)),
+            'uptime_s': elapsed,
+        }
+
+
+# Minimal HTTP/1.1 (keep-alive) over TCP or a Unix socket:
+#   POST /predict  {"FlowRate": ..., ...}           -> {"CH4_Yield": ...}
+#   POST /predict  {"rows": [{...}, {...}]}         -> {"CH4_Yield": [...]}
+#   GET  /stats                                     -> latency percentiles and counters
+
+def to_vector(ensemble, row):
+    # Validate here, per request, so one malformed row cannot fail a whole shared batch
+    return feature_vector(row, ensemble.feature_names)
+
+
+async def handle_request(batcher, method, path, body):
+    if method == "GET" and path == "/stats":
+        return 200, batcher.stats.summary()
+    if method == "POST" and path == "/predict":
+        ensemble = backend.get_fast_model()
+        payload = json.loads(body or b"{}")
+        try:
+            if "rows" in payload:
+                vectors = [to_vector(ensemble, row) for row in payload["rows"]]
+                predictions = await asyncio.gather(*(batcher.predict(v) for v in vectors))
+                return 200, {'CH4_Yield': [round(p, 4) for p in predictions]}
+            prediction = await batcher.predict(to_vector(ensemble, payload))
+            return 200, {'CH4_Yield': round(prediction, 4)}
+        except (ValueError, TypeError) as e:
+            return 400, {'error': str(e)}
+    return 404, {'error': f"no route for {method} {path}"}
+
+
+async def read_request(reader, request_line):
+    # Raises ValueError (UnicodeDecodeError included) for a request line or header that does not parse
+    method, path, _ = request_line.decode().split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError(f"invalid Content-Length {length}")
+    return method, path, headers, await reader.readexactly(length)
+
+
+async def respond(writer, status, result):
+    data = json.dumps(result).encode()
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+    )
+    await writer.drain()
+
+
+async def serve_connection(batcher, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, path, headers, body = await read_request(reader, request_line)
+            except ValueError as e:
+                # Where the next request would start is unknown, so answer and close
+                await respond(writer, 400, {'error': f"malformed request: {e}"})
+                break
+
+            try:
+                status, result = await handle_request(batcher, method, path, body)
+            except (ValueError, TypeError) as e:
+                status, result = 400, {'error': str(e)}
+            except Exception as e:
+                # Anything unexpected still gets an answer instead of a silently dropped connection
+                status, result = 500, {'error': f"{type(e).__name__}: {e}"}
+            await respond(writer, status, result)
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main(args):
+    backend.load_model(args.model)
+    batcher = MicroBatcher(max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    batch_task = asyncio.create_task(batcher.run())
+
+    def handler(reader, writer):
+        return serve_connection(batcher, reader, writer)
+
+    if args.unix_socket:
+        server = await asyncio.start_unix_server(handler, path=args.unix_socket)
+        print(f" Serving predictions on unix:{args.unix_socket}")
+    else:
+        server = await asyncio.start_server(handler, host=args.host, port=args.port)
+        print(f" Serving predictions on http://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+    batch_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching methane-yield prediction service")
+    parser.add_argument("--model", default=backend.MODEL_PATH, help="trained_model.joblib to serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=256, help="largest micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="longest a request waits for its batch to fill")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+
+
+# Persistent, content-addressed store of simulation results.
+# Keys hash the scenario inputs together with everything else that decides the answer
+# (params, solver settings, horizon, model version), so a changed setting never returns
+# a stale result. SQLite in WAL mode lets several sweep processes read and write at once.
+# Only successful results are stored, so a scenario whose solve failed is retried next time.
+# The entry count lives in a meta row kept exact by triggers, so eviction never scans the table.
+
+class SimulationCache:
+    def __init__(self, path, params, solver_settings, hours, model_version, max_entries=2_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        context = {
+            'params': params,
+            'solver': solver_settings,
+            'hours': hours,
+            'model_version': model_version,
+        }
+        self.context_hash = hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON results (last_access)")
+        self.conn.commit()
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS count_insert AFTER INSERT ON results "
+                "BEGIN UPDATE meta SET value = value + 1 WHERE name = 'count'; END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS count_delete AFTER DELETE ON results "
+                "BEGIN UPDATE meta SET value = value - 1 WHERE name = 'count'; END"
+            )
+            # Caches created before the counter existed are counted once, here
+            self.conn.execute("INSERT OR IGNORE INTO meta SELECT 'count', COUNT(*) FROM results "
+                              "WHERE NOT EXISTS (SELECT 1 FROM meta WHERE name = 'count')")
+
+    def key(self, scenario):
+        inputs = ",".join(repr(float(x)) for x in scenario)
+        return hashlib.sha256(f"{self.context_hash}|{inputs}".encode()).hexdigest()
+
+    def get_many(self, scenarios):
+        keys = [self.key(s) for s in scenarios]
+        found = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE results SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+                )
+        results = [json.loads(found[k]) if k in found else None for k in keys]
+        # Failures cached by older versions count as misses, so they are solved again
+        return [r if r is not None and math.isfinite(r.get('CH4_Yield', math.nan)) else None for r in results]
+
+    def put_many(self, scenarios, results):
+        now = time.time()
+        rows = [
+            # Numbers only: failure messages and other annotations are not cached
+            (self.key(s), json.dumps({k: float(v) for k, v in r.items() if not isinstance(v, str)}), now)
+            for s, r in zip(scenarios, results)
+            # Failures are not cached: a transient solver failure must stay retryable
+            if math.isfinite(r.get('CH4_Yield', math.nan))
+        ]
+        with self.conn:
+            # Upsert rather than REPLACE, whose implicit delete would bypass the count triggers
+            self.conn.executemany(
+                "INSERT INTO results (key, value, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, last_access = excluded.last_access", rows
+            )
+        self.evict()
+
+    def count(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'count'").fetchone()
+        return row[0] if row else 0
+
+    def evict(self):
+        # LRU: drop the least recently used entries once the cap is exceeded
+        excess = self.count() - self.max_entries
+        if excess > 0:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_access LIMIT ?)", (excess,)
+                )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+
+# Chunking helpers
+
+def chunk_scenarios(scenarios, chunk_size):
+    return [scenarios[i:i + chunk_size] for i in range(0, len(scenarios), chunk_size)]
+
+
+def grid_fingerprint(scenarios, chunk_size):
+    h = hashlib.sha256()
+    h.update(str(chunk_size).encode())
+    for scenario in scenarios:
+        h.update(repr(scenario).encode())
+    return h.hexdigest()
+
+
+def chunk_path(work_dir, index):
+    return os.path.join(work_dir, f"chunk_{index:05d}.csv")
+
+
+def temp_path(path):
+    # Hidden temp name next to path, unique to this writer: when a queue lease runs out, the same
+    # chunk can be written by two hosts at once, and each must finish its own file before the replace
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{socket.gethostname()}-{os.getpid()}.tmp")
+
+
+def write_chunk(records, path):
+    # Write to a temp file first so a crash never leaves a half-written chunk behind
+    tmp_path = temp_path(path)
+    pd.DataFrame(records).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# Chunk writers: where a finished chunk goes and how a restart tells it is already done.
+# Anything with the same three methods (e.g. dataset_store.PartWriter) can be passed to run_sweep.
+
+class CsvChunkWriter:
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+
+    def path(self, index):
+        return chunk_path(self.work_dir, index)
+
+    def exists(self, index):
+        return os.path.exists(self.path(index))
+
+    def write(self, records, index):
+        write_chunk(records, self.path(index))
+
+
+# Manifest: guards against resuming a run with a different grid or chunk size
+
+def read_manifest(work_dir):
+    manifest_path = os.path.join(work_dir, "_manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def check_manifest(work_dir, fingerprint, n_chunks):
+    manifest = read_manifest(work_dir)
+    if manifest is not None:
+        if manifest["fingerprint"] != fingerprint:
+            raise ValueError(
+                f"{work_dir} holds chunks from a different grid or chunk size; "
+                "use a fresh work directory or delete the old chunks"
+            )
+        return
+    # Several shards may create the same manifest at once; the atomic replace makes that harmless
+    manifest_path = os.path.join(work_dir, "_manifest.json")
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "n_chunks": n_chunks}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+# Sharding: shard i of N owns every chunk whose index is i modulo N, a deterministic
+# slice that needs no coordination between hosts
+
+def parse_shard(spec):
+    i, n = (int(x) for x in spec.split("/"))
+    if not 0 <= i < n:
+        raise ValueError(f"shard must look like i/N with 0 <= i < N, got {spec!r}")
+    return i, n
+
+
+def shard_chunks(n_chunks, shard=None):
+    if shard is None:
+        return list(range(n_chunks))
+    i, n = shard
+    return list(range(i, n_chunks, n))
+
+
+# Sweep driver
+
+def run_sweep(scenarios, simulate_chunk, work_dir, workers=None, chunk_size=500, writer=None, shard=None, queue=None,
+              telemetry=None):
+    """Run simulate_chunk over every chunk of scenarios across a process pool.
+
+    Completed chunks are written as they finish (CSV files in work_dir unless another
+    writer is given) and are skipped on restart. simulate_chunk must be a module-level
+    function taking a list of scenarios and returning a list of record dicts.
+    shard=(i, N) restricts the run to one slice of the chunks; queue (a work_queue.WorkQueue)
+    hands chunks out dynamically so several hosts can share one sweep.
+    If simulate_chunk returns (records, telemetry_rows), the rows go to the telemetry writer.
+    """
+    scenarios = list(scenarios)
+    chunks = chunk_scenarios(scenarios, chunk_size)
+    writer = writer or CsvChunkWriter(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    check_manifest(work_dir, grid_fingerprint(scenarios, chunk_size), len(chunks))
+
+    mine = shard_chunks(len(chunks), shard)
+    pending = [i for i in mine if not writer.exists(i)]
+    done = len(mine) - len(pending)
+    if done:
+        print(f" Resuming sweep: {done}/{len(mine)} chunks already on disk.")
+
+    if queue is not None:
+        queue.populate(pending)
+        next_chunk, on_done = queue.claim, queue.complete
+    else:
+        remaining = iter(pending)
+        next_chunk, on_done = (lambda: next(remaining, None)), (lambda i: None)
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    total = sum(len(chunks[i]) for i in pending)
+    simulated = dropped = 0
+
+    def finish(output, i):
+        nonlocal done, simulated, dropped
+        records, rows = output if isinstance(output, tuple) else (output, None)
+        writer.write(records, i)
+        if telemetry is not None and rows is not None:
+            telemetry.write(rows, i)
+        on_done(i)
+        done += 1
+        simulated += len(chunks[i])
+        dropped += len(chunks[i]) - len(records)
+        elapsed = time.perf_counter() - start
+        rate = simulated / elapsed if elapsed > 0 else 0.0
+        eta = (total - simulated) / rate if rate > 0 else 0.0
+        print(f" Chunk {done}/{len(mine)} done ({elapsed:.1f}s, {rate:.1f} scenarios/s, "
+              f"ETA {eta:.0f}s, {dropped} failed)", flush=True)
+
+    if workers == 1:
+        i = next_chunk()
+        while i is not None:
+            finish(simulate_chunk(chunks[i]), i)
+            i = next_chunk()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep at most one chunk per worker in flight so queue claims stay fresh
+            in_flight = {}
+            while True:
+                while len(in_flight) < workers:
+                    i = next_chunk()
+                    if i is None:
+                        break
+                    in_flight[pool.submit(simulate_chunk, chunks[i])] = i
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(future.result(), in_flight.pop(future))
+
+    if simulated:
+        elapsed = time.perf_counter() - start
+        print(f" Sweep: {simulated} scenarios in {elapsed:.1f}s ({simulated / elapsed:.1f} scenarios/s), "
+              f"{dropped} failed or non-finite")
+    return [writer.path(i) for i in mine]
+
+
+def map_chunks(scenarios, simulate_chunk, workers=None, chunk_size=500):
+    # In-memory counterpart of run_sweep for small, one-off batches (e.g. sampler rounds)
+    chunks = chunk_scenarios(list(scenarios), chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        return [record for chunk in chunks for record in simulate_chunk(chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [record for records in pool.map(simulate_chunk, chunks) for record in records]
@@ -0,0 +1,168 @@
+import cProfile
+import io
+import os
+import pstats
+
+import numpy as np
+import pandas as pd
+
+from features import INPUT_COLUMNS
+from sweep_engine import temp_path
+
+
+# Opt-in per-scenario solver telemetry for sweeps. With --telemetry every chunk also writes a
+# sidecar table to <work_dir>/_telemetry/part-NNNNN.parquet (pyarrow dataset discovery skips
+# "_" directories, so it never mixes with the training rows). One row per scenario, failed
+# ones included: status, failure reason, nfev/njev/nlu and wall time. Batched solves (batched = 1)
+# share their solver counts and split their wall time evenly, so those fields describe the chunk,
+# not the scenario; scenarios that fell back to the per-scenario path (batched = 0) have their own.
+# Ranking therefore never compares batch-shared costs: worst_scenarios re-times members of the
+# costliest chunks one at a time to get a real per-scenario cost.
+
+TELEMETRY_DIR = "_telemetry"
+TELEMETRY_COLUMNS = INPUT_COLUMNS + ['status', 'error', 'nfev', 'njev', 'nlu', 'wall_s', 'batched', 'chunk']
+
+
+def telemetry_rows(scenarios, results):
+    rows = []
+    for scenario, result in zip(scenarios, results):
+        if result.get('cached'):
+            status = 'cached'
+        elif np.isfinite(result['CH4_Yield']):
+            status = 'ok'
+        else:
+            status = 'failed'
+        rows.append({
+            **dict(zip(INPUT_COLUMNS, map(float, scenario))),
+            'status': status,
+            'error': result.get('error', ''),
+            'nfev': float(result.get('nfev', np.nan)),
+            'njev': float(result.get('njev', np.nan)),
+            'nlu': float(result.get('nlu', np.nan)),
+            'wall_s': float(result.get('wall_s', np.nan)),
+            'batched': float(result.get('batched', 0.0)),
+        })
+    return rows
+
+
+class TelemetryWriter:
+    # Same interface as the chunk writers in sweep_engine / dataset_store
+    def __init__(self, work_dir):
+        self.root = os.path.join(work_dir, TELEMETRY_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, index):
+        return os.path.join(self.root, f"part-{index:05d}.parquet")
+
+    def write(self, rows, index):
+        path = self.path(index)
+        tmp_path = temp_path(path)
+        # The chunk index identifies which rows shared one batched solve
+        pd.DataFrame([dict(row, chunk=index) for row in rows], columns=TELEMETRY_COLUMNS).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+def read_telemetry(work_dir):
+    root = os.path.join(work_dir, TELEMETRY_DIR)
+    parts = sorted(f for f in os.listdir(root) if f.endswith(".parquet")) if os.path.isdir(root) else []
+    if not parts:
+        return pd.DataFrame(columns=TELEMETRY_COLUMNS)
+    df = pd.concat([pd.read_parquet(os.path.join(root, f)) for f in parts], ignore_index=True)
+    # Parts written before the chunk column existed count as one chunk
+    df = df.reindex(columns=TELEMETRY_COLUMNS)
+    df['chunk'] = df['chunk'].fillna(-1)
+    return df
+
+
+def quantile_lines(table, columns):
+    lines = []
+    for column in columns:
+        q = table[column].quantile([0.5, 0.9, 0.99, 1.0])
+        lines.append(f"   {column:<6} p50 {q[0.5]:.4g}  p90 {q[0.9]:.4g}  p99 {q[0.99]:.4g}  max {q[1.0]:.4g}")
+    return lines
+
+
+def chunk_costs(df):
+    # One row per batched chunk: its total wall time and its (shared) solver counts
+    batched = df[(df['status'] != 'cached') & (df['batched'] == 1)]
+    return batched.groupby('chunk').agg(wall_s=('wall_s', 'sum'), nfev=('nfev', 'max'), nlu=('nlu', 'max'),
+                                        scenarios=('wall_s', 'size'))
+
+
+def summarize(df, top=5):
+    lines = [f" Telemetry: {len(df)} scenarios, " + ", ".join(f"{n} {s}" for s, n in df['status'].value_counts().items())]
+    solved = df[df['status'] != 'cached']
+    own = solved[solved['batched'] == 0]
+    if len(own):
+        lines.append(f"   {len(own)} per-scenario solves:")
+        lines += quantile_lines(own, ('wall_s', 'nfev', 'nlu'))
+    chunks = chunk_costs(df)
+    if len(chunks):
+        lines.append(f"   {len(solved) - len(own)} scenarios solved in {len(chunks)} batched chunks. Their nfev/nlu are "
+                     "per batch and wall_s an even share, so they are summarized per chunk, not per scenario:")
+        lines += quantile_lines(chunks, ('wall_s', 'nfev', 'nlu'))
+    failures = df.loc[df['status'] == 'failed', 'error'].value_counts().head(top)
+    for reason, n in failures.items():
+        lines.append(f"   {n} x {reason or 'non-finite result'}")
+    return "\n".join(lines)
+
+
+def retime(rows, method="LSODA", mode="dynamic"):
+    # Per-scenario cost for rows whose telemetry only holds their batch's shared cost
+    from data_generator import simulate_two_stage_system
+    measured = rows.copy()
+    for index, row in rows.iterrows():
+        result = simulate_two_stage_system(*(row[c] for c in INPUT_COLUMNS), method=method, mode=mode)
+        measured.loc[index, ['wall_s', 'nfev', 'nlu']] = [result['wall_s'], result.get('nfev', np.nan),
+                                                          result.get('nlu', np.nan)]
+    return measured.assign(batched=0.0)
+
+
+def worst_scenarios(df, n, method="LSODA", mode="dynamic", retime_limit=100):
+    """Failures first, then the slowest and most expensive solves, ranked on per-scenario costs only.
+
+    Batched rows carry their chunk's shared cost, which cannot tell members apart, so up to
+    retime_limit members of the costliest chunks are re-run one at a time and ranked on that.
+    """
+    solved = df[df['status'] != 'cached']
+    failed = solved[solved['status'] == 'failed']
+    ranked = [solved[(solved['status'] != 'failed') & (solved['batched'] == 0)]]
+    chunks = chunk_costs(df).sort_values('wall_s', ascending=False)
+    if len(chunks) and n > len(failed):
+        picked = chunks.index[chunks['scenarios'].cumsum().to_numpy() - chunks['scenarios'].to_numpy() < retime_limit]
+        members = solved[(solved['status'] != 'failed') & (solved['batched'] == 1) & solved['chunk'].isin(picked)]
+        ranked.append(retime(members.head(retime_limit), method, mode))
+    ranked = pd.concat(ranked).sort_values(['wall_s', 'nfev'], ascending=False)
+    return pd.concat([failed, ranked]).head(n)
+
+
+def profile_worst(df, n, out_dir, method="LSODA", mode="dynamic", top_functions=15):
+    """Re-run the worst n scenarios one at a time under cProfile.
+
+    Writes one .prof file per scenario (open with pstats or snakeviz) and a text summary.
+    """
+    from data_generator import simulate_two_stage_system
+    os.makedirs(out_dir, exist_ok=True)
+    report = []
+    for rank, (_, row) in enumerate(worst_scenarios(df, n, method=method, mode=mode).iterrows()):
+        scenario = tuple(row[c] for c in INPUT_COLUMNS)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        result = simulate_two_stage_system(*scenario, method=method, mode=mode)
+        profiler.disable()
+        prof_path = os.path.join(out_dir, f"worst-{rank:03d}.prof")
+        profiler.dump_stats(prof_path)
+
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top_functions)
+        report.append(
+            f"#{rank} {dict(zip(INPUT_COLUMNS, scenario))}\n"
+            f"   ranked on: status={row['status']} wall_s={row['wall_s']:.4g} nfev={row['nfev']:.0f} {row['error']}\n"
+            f"   rerun ({method}): wall_s={result.get('wall_s', float('nan')):.4g} nfev={result.get('nfev', 0)} "
+            f"nlu={result.get('nlu', 0)} {result.get('error', '')}\n"
+            f"   profile: {prof_path}\n{text.getvalue()}"
+        )
+    summary_path = os.path.join(out_dir, "worst_scenarios.txt")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(report))
+    return summary_path
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+# The pipeline is a flat set of scripts; make them importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import FEATURE_COLUMNS, INPUT_COLUMNS, prepare_features  # noqa: E402
+
+
+def synthetic_inputs(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'FlowRate': rng.uniform(30, 180, n_rows),
+        'Temp1': rng.uniform(28, 40, n_rows),
+        'Temp2': rng.uniform(32, 45, n_rows),
+        'Agitator1_kW': rng.uniform(0.2, 2.0, n_rows),
+        'Agitator2_kW': rng.uniform(0.5, 3.0, n_rows),
+        'Recycle_Ratio': rng.uniform(0.05, 0.5, n_rows),
+        'PalmFrac': rng.uniform(0.0, 0.5, n_rows),
+        'SugarIn': rng.uniform(2.0, 10.0, n_rows),
+        'VFA': rng.uniform(0.0, 0.01, n_rows),
+        'NH3': rng.uniform(0.0, 0.01, n_rows),
+    })[INPUT_COLUMNS + ['VFA', 'NH3']]
+
+
+@pytest.fixture(scope="session")
+def model_path(tmp_path_factory):
+    # Small GradientBoosting model on synthetic rows, enough to exercise the serving paths
+    from sklearn.ensemble import GradientBoostingRegressor
+    df = synthetic_inputs(300)
+    X = prepare_features(df, FEATURE_COLUMNS)
+    y = 0.001 * df['SugarIn'] * (1 - df['PalmFrac']) + 1e-5 * df['FlowRate']
+    model = GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0).fit(X, y)
+    path = tmp_path_factory.mktemp("model") / "trained_model.joblib"
+    joblib.dump(model, path)
+    return str(path)
@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks import compare
+
+
+def run(quick, wall_s, python="3.11"):
+    return {
+        'environment': {'python': python, 'commit': "abc", 'timestamp': "now"},
+        'config': {'quick': quick, 'sweep_scenarios': 400 if quick else 2000, 'workers': [1, 2]},
+        'results': {'sweep': {'workers_1': {'wall_s': wall_s, 'scenarios_per_s': 2000 / wall_s}}},
+    }
+
+
+def test_compare_refuses_a_baseline_with_another_configuration():
+    with pytest.raises(ValueError, match="sweep_scenarios"):
+        compare(run(quick=True, wall_s=20.0), run(quick=False, wall_s=10.0))
+    table = compare(run(quick=True, wall_s=20.0), run(quick=False, wall_s=10.0), allow_mismatch=True)
+    assert set(table['status']) == {"regression"}
+
+
+def test_compare_flags_regressions_and_only_warns_on_environment(capsys):
+    table = compare(run(quick=False, wall_s=12.0, python="3.12"), run(quick=False, wall_s=10.0)).set_index('metric')
+    assert table.loc['sweep.workers_1.wall_s', 'status'] == "regression"
+    assert table.loc['sweep.workers_1.scenarios_per_s', 'status'] == "regression"
+    assert "environment.python" in capsys.readouterr().out
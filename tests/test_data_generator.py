@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from data_generator import save_datasets, simulate_chunk, simulate_two_stage_batch, simulate_two_stage_system
+from dataset_store import load_dataset
+from doe_sampler import latin_hypercube, simulate_points, to_scenarios
+
+
+def test_batched_steady_state_matches_per_scenario_solves():
+    scenarios = to_scenarios(latin_hypercube(40, seed=7))
+    batched = simulate_two_stage_batch(scenarios, mode="steady_state")
+    single = [simulate_two_stage_system(*s, method="BDF", mode="steady_state") for s in scenarios]
+    for column in ('CH4_Yield', 'Final_VFA', 'Final_NH3'):
+        np.testing.assert_allclose([r[column] for r in batched], [r[column] for r in single], rtol=1e-6)
+    assert all(r.get('batched') for r in batched)
+
+
+def test_save_datasets_keeps_an_existing_dataset(tmp_path):
+    first = simulate_points(latin_hypercube(20, seed=1), simulate_chunk, workers=1)
+    second = simulate_points(latin_hypercube(30, seed=2), simulate_chunk, workers=1)
+    save_datasets(first, str(tmp_path))
+    with pytest.raises(FileExistsError):
+        save_datasets(second, str(tmp_path))
+    assert len(load_dataset(str(tmp_path))) == 20
+
+    save_datasets(second, str(tmp_path), overwrite=True)
+    assert len(load_dataset(str(tmp_path))) == 30
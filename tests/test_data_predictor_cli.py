@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+import data_predictor_cli
+from conftest import synthetic_inputs
+
+
+def test_bad_flow_row_is_skipped_not_fatal(model_path, tmp_path):
+    data_predictor_cli.load_model(model_path)
+    df = synthetic_inputs(25, seed=3)
+    # Row 14 is in the second of three chunks
+    df.loc[14, 'FlowRate'] = 0.0
+    df.loc[20, 'FlowRate'] = -3.0
+    input_path, output_path = tmp_path / "historian.csv", tmp_path / "predictions.csv"
+    df.to_csv(input_path, index=False)
+
+    rows, _ = data_predictor_cli.predict_stream(str(input_path), str(output_path), chunk_size=10)
+
+    out = pd.read_csv(output_path)
+    predicted = out[data_predictor_cli.PREDICTION_COLUMN]
+    assert rows == len(out) == 25
+    assert predicted[[14, 20]].isna().all()
+    assert predicted.drop([14, 20]).notna().all()
+    # The bad readings are passed through unchanged
+    assert np.allclose(out['FlowRate'], df['FlowRate'])
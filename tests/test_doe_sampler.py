@@ -0,0 +1,26 @@
+import numpy as np
+
+from data_generator import SCENARIO_FIELDS, simulate_chunk
+from doe_sampler import active_learning, fit_committee, latin_hypercube, lower, simulate_points, upper
+
+BUDGET = 300
+
+
+def holdout_rmse(df, test):
+    # Same model settings as one committee member, scored on an independent LHS hold-out set
+    model = fit_committee(df, n_models=1, seed=0)[0]
+    predicted = model.predict(test[list(SCENARIO_FIELDS)].to_numpy())
+    return np.sqrt(np.mean((predicted - test['CH4_Yield'].to_numpy()) ** 2))
+
+
+def test_active_learning_beats_random_and_lhs_at_equal_budget():
+    test = simulate_points(latin_hypercube(500, seed=999), simulate_chunk, workers=1)
+    active = active_learning(BUDGET, simulate_chunk, workers=1, seed=0)
+    uniform = np.random.default_rng(0).uniform(lower, upper, (BUDGET, len(lower)))
+    random = simulate_points(uniform, simulate_chunk, workers=1)
+    lhs = simulate_points(latin_hypercube(BUDGET, seed=0), simulate_chunk, workers=1)
+
+    assert len(active) == len(random) == len(lhs) == BUDGET
+    active_rmse = holdout_rmse(active, test)
+    assert active_rmse < holdout_rmse(random, test)
+    assert active_rmse < holdout_rmse(lhs, test)
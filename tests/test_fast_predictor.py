@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+from conftest import synthetic_inputs
+from fast_predictor import TreeEnsemble
+from features import FEATURE_COLUMNS, prepare_features
+
+
+@pytest.mark.parametrize("model", [
+    GradientBoostingRegressor(n_estimators=60, max_depth=4, random_state=0),
+    HistGradientBoostingRegressor(max_iter=60, max_depth=6, random_state=0),
+], ids=["gbr", "hist"])
+def test_flattened_ensemble_matches_sklearn(model):
+    train = synthetic_inputs(800, seed=0)
+    X = prepare_features(train, FEATURE_COLUMNS)
+    y = 0.004 * train['SugarIn'] * (1 - train['PalmFrac']) * np.exp(-((train['Temp2'] - 38) / 4) ** 2)
+    model.fit(X, y)
+
+    ensemble = TreeEnsemble.from_model(model)
+    X_test = prepare_features(synthetic_inputs(2000, seed=1), FEATURE_COLUMNS)
+    expected = model.predict(X_test)
+    # Batched walk (several row blocks) and the single-row path both agree with scikit-learn
+    np.testing.assert_allclose(ensemble.predict(X_test, batch_rows=256), expected, rtol=0, atol=1e-12)
+    single = [ensemble.predict_one(row) for row in X_test.to_numpy()[:50]]
+    np.testing.assert_allclose(single, expected[:50], rtol=0, atol=1e-12)
+    assert ensemble.feature_names == FEATURE_COLUMNS
@@ -0,0 +1,69 @@
+import os
+import shutil
+import threading
+
+import joblib
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+
+import backend
+from conftest import synthetic_inputs
+from features import FEATURE_COLUMNS, prepare_features
+from model_artifact import SharedModel, artifact_dir_for, current_version, export_artifact, load_shared
+
+
+def test_mapped_model_matches_joblib(model_path):
+    X = prepare_features(synthetic_inputs(500, seed=1), FEATURE_COLUMNS)
+    expected = joblib.load(model_path).predict(X)
+
+    ensemble = load_shared(model_path)
+    assert isinstance(ensemble.value, np.ndarray) and not ensemble.value.flags.writeable
+    np.testing.assert_allclose(ensemble.predict(X), expected, rtol=0, atol=1e-12)
+    assert ensemble.predict_one(X.iloc[0]) == np.float64(ensemble.predict(X.iloc[:1])[0])
+
+    backend.load_model(model_path)
+    np.testing.assert_allclose(backend.predict_methane_yield_batch(synthetic_inputs(500, seed=1)), expected,
+                               rtol=0, atol=1e-12)
+    backend.release_model()
+
+
+def test_publish_swaps_current_while_old_reader_keeps_working(model_path, tmp_path):
+    path = str(tmp_path / "trained_model.joblib")
+    shutil.copy(model_path, path)
+    artifact_dir = artifact_dir_for(path)
+    X = prepare_features(synthetic_inputs(200, seed=2), FEATURE_COLUMNS)
+
+    shared = SharedModel(path, check_interval=0)
+    old = shared.get()
+    before = old.predict(X)
+
+    # Retrained model: a different target, so old and new predictions differ
+    df = synthetic_inputs(300, seed=5)
+    retrained = GradientBoostingRegressor(n_estimators=10, max_depth=2, random_state=0).fit(
+        prepare_features(df, FEATURE_COLUMNS), 0.002 * df['Temp2'])
+
+    # A reader polling the pointer during publishes must always see a complete CURRENT
+    seen, stop = [], threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            seen.append(current_version(artifact_dir))
+    reader = threading.Thread(target=poll)
+    reader.start()
+    try:
+        for _ in range(5):
+            # keep=1 prunes the version the old reader still maps
+            version = export_artifact(path, artifact_dir, model=retrained, keep=1)
+    finally:
+        stop.set()
+        reader.join()
+
+    assert seen and all(v.startswith("v") for v in seen)
+    assert current_version(artifact_dir) == version
+    assert not [name for name in os.listdir(artifact_dir) if name.endswith(".tmp")]
+
+    new = shared.get()
+    assert new.version == version != old.version
+    np.testing.assert_allclose(new.predict(X), retrained.predict(X), rtol=0, atol=1e-12)
+    # Calls already holding the old mapping finish on the old model
+    np.testing.assert_array_equal(old.predict(X), before)
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+
+import backend
+import prediction_server
+from features import feature_vector, prepare_features
+
+ROW = {'FlowRate': 100.0, 'Temp1': 35.0, 'Temp2': 40.0, 'Agitator1_kW': 1.0, 'Agitator2_kW': 1.5,
+       'Recycle_Ratio': 0.2, 'PalmFrac': 0.3, 'SugarIn': 6.0, 'VFA': 0.005, 'NH3': 0.005}
+
+
+def test_non_positive_flow_is_rejected():
+    for flow in (0.0, -5.0):
+        with pytest.raises(ValueError, match="FlowRate"):
+            feature_vector(dict(ROW, FlowRate=flow))
+        with pytest.raises(ValueError, match="FlowRate"):
+            prepare_features([ROW, dict(ROW, FlowRate=flow)])
+
+
+async def send(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b" ", 2)[1])
+    return status, json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+def post_request(payload):
+    body = json.dumps(payload).encode()
+    return f"POST /predict HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+
+
+def serve_and_send(requests):
+    async def run():
+        batcher = prediction_server.MicroBatcher()
+        batch_task = asyncio.create_task(batcher.run())
+        server = await asyncio.start_server(
+            lambda r, w: prediction_server.serve_connection(batcher, r, w), host="127.0.0.1", port=0
+        )
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await send(port, request) for request in requests]
+        finally:
+            server.close()
+            batch_task.cancel()
+    return asyncio.run(run())
+
+
+def test_server_answers_bad_and_failing_requests(model_path, monkeypatch):
+    backend.load_model(model_path)
+    ok, zero_flow = serve_and_send([post_request(ROW), post_request(dict(ROW, FlowRate=0))])
+    assert ok[0] == 200 and isinstance(ok[1]['CH4_Yield'], float)
+    assert zero_flow[0] == 400 and "FlowRate" in zero_flow[1]['error']
+
+    # An unexpected failure inside the handler still produces a response
+    def broken(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(prediction_server, "to_vector", broken)
+    (status, result), = serve_and_send([post_request(ROW)])
+    assert status == 500 and "boom" in result['error']
+
+
+def test_server_answers_malformed_requests(model_path):
+    backend.load_model(model_path)
+    responses = serve_and_send([
+        b"GARBAGE\r\n\r\n",
+        b"POST /predict HTTP/1.1\r\nContent-Length: abc\r\n\r\n{}",
+        b"POST /predict HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+        b"POST /predict HTTP/1.1\r\nContent-Length: 5\r\nConnection: close\r\n\r\n{oops",
+    ])
+    assert [status for status, _ in responses] == [400, 400, 400, 400]
+    assert all("error" in result for _, result in responses)
@@ -0,0 +1,71 @@
+import itertools
+import math
+
+import pytest
+
+import sim_cache
+from sim_cache import SimulationCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock, so LRU order does not depend on the timer resolution
+    ticks = itertools.count()
+    monkeypatch.setattr(sim_cache.time, "time", lambda: float(next(ticks)))
+    cache = SimulationCache(str(tmp_path / "cache.sqlite"), {'k': 1.0}, {'method': 'BDF'}, 30, "test", max_entries=5)
+    yield cache
+    cache.close()
+
+
+def scenario(i):
+    return (float(i), 35.0, 40.0, 1.0, 1.5, 0.2, 0.3, 6.0)
+
+
+def result(i):
+    return {'CH4_Yield': 0.01 * i, 'nfev': 10.0}
+
+
+def stored_keys(cache):
+    return {key for (key,) in cache.conn.execute("SELECT key FROM results")}
+
+
+def test_count_follows_inserts_overwrites_and_evictions(cache):
+    for i in range(4):
+        cache.put_many([scenario(i)], [result(i)])
+    assert cache.count() == 4
+    # Overwriting an existing key goes through the upsert and must not grow the count
+    cache.put_many([scenario(2)], [result(9)])
+    assert cache.count() == 4
+    assert cache.get_many([scenario(2)]) == [result(9)]
+
+    # Access order is now 1, 3, 2, 0. Filling past the cap drops the least recently used
+    cache.get_many([scenario(0)])
+    cache.put_many([scenario(i) for i in range(4, 8)], [result(i) for i in range(4, 8)])
+    assert cache.count() == len(stored_keys(cache)) == 5
+    assert stored_keys(cache) == {cache.key(scenario(i)) for i in (0, 4, 5, 6, 7)}
+    assert cache.get_many([scenario(i) for i in range(8)]) == [
+        result(0), None, None, None, result(4), result(5), result(6), result(7)
+    ]
+
+
+def test_failed_results_are_not_cached(cache):
+    cache.put_many([scenario(1), scenario(2)], [{'CH4_Yield': math.nan, 'error': "stage 1: RuntimeError"}, result(2)])
+    assert cache.count() == 1
+    assert cache.get_many([scenario(1), scenario(2)]) == [None, result(2)]
+
+    # A failure stored by an older version reads back as a miss
+    cache.conn.execute("INSERT INTO results VALUES (?, ?, 0)", (cache.key(scenario(3)), '{"CH4_Yield": NaN}'))
+    assert cache.get_many([scenario(3)]) == [None]
+
+
+def test_count_is_initialised_for_caches_without_one(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    cache = SimulationCache(path, {}, {}, 30, "test")
+    cache.put_many([scenario(i) for i in range(3)], [result(i) for i in range(3)])
+    cache.conn.execute("DROP TABLE meta")
+    cache.conn.commit()
+    cache.close()
+
+    reopened = SimulationCache(path, {}, {}, 30, "test")
+    assert reopened.count() == 3
+    reopened.close()
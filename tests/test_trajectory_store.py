@@ -0,0 +1,30 @@
+from functools import partial
+
+import numpy as np
+
+from data_generator import backfill_trajectories, simulate_chunk, simulate_two_stage_batch
+from dataset_store import PartWriter
+from doe_sampler import latin_hypercube, to_scenarios
+from sweep_engine import run_sweep
+from trajectory_store import NOT_WRITTEN, OK, TrajectoryStore
+
+
+def test_resume_with_trajectories_backfills_finished_chunks(tmp_path):
+    scenarios = to_scenarios(latin_hypercube(25, seed=4))
+    work_dir, store_path = str(tmp_path / "dataset"), str(tmp_path / "trajectories")
+    writer = PartWriter(work_dir)
+    # A first run without trajectories finishes chunks 0 and 2 of 3 (shard 0 of 2)
+    run_sweep(scenarios, simulate_chunk, work_dir, workers=1, chunk_size=10, writer=writer, shard=(0, 2))
+
+    # The resume skips those chunks, so their 15 slots must come from the backfill; chunk 1 fills the rest
+    TrajectoryStore.create(store_path, scenarios, points=50)
+    assert backfill_trajectories(store_path, scenarios, writer, 10, workers=1) == 15
+    run_sweep(scenarios, partial(simulate_chunk, trajectories=store_path), work_dir, workers=1, chunk_size=10,
+              writer=writer)
+
+    store = TrajectoryStore(store_path)
+    assert (np.asarray(store.status) == OK).all() and not (np.asarray(store.status) == NOT_WRITTEN).any()
+    expected = simulate_two_stage_batch(scenarios[:10], trajectory_points=50)
+    np.testing.assert_allclose(store.data[3], expected[3]['trajectory'], rtol=1e-5, atol=1e-7)
+    # A second resume has nothing left to backfill
+    assert backfill_trajectories(store_path, scenarios, writer, 10, workers=1) == 0
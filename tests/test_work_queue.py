@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import work_queue
+from data_generator import build_record
+from dataset_store import PartWriter, load_dataset, merge_datasets
+from sweep_engine import run_sweep
+from work_queue import WorkQueue
+
+
+def test_expired_lease_is_claimed_again(tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(work_queue.time, "time", lambda: clock[0])
+    path = str(tmp_path / "queue.sqlite")
+    host_a, host_b = WorkQueue(path, lease_seconds=100), WorkQueue(path, lease_seconds=100)
+    host_a.owner, host_b.owner = "a:1", "b:1"
+    host_a.populate(range(3))
+
+    assert host_a.claim() == 0
+    clock[0] = 10.0
+    # Chunk 0 is leased to host a, so host b gets the next one
+    assert host_b.claim() == 1
+    host_b.complete(1)
+    assert host_b.claim() == 2
+
+    # Host a died: once its lease is older than lease_seconds, chunk 0 goes to host b
+    clock[0] = 150.0
+    assert host_b.claim() == 0
+    assert host_b.conn.execute("SELECT owner FROM chunks WHERE idx = 0").fetchone() == ("b:1",)
+    host_b.complete(0)
+    host_b.complete(2)
+    # Completed chunks are never handed out again, however old their claim
+    clock[0] = 1000.0
+    assert host_a.claim() is None
+    assert host_a.counts() == {'done': 3}
+    host_a.close()
+    host_b.close()
+
+
+def fake_chunk(scenarios):
+    return [build_record(*s, {'Final_VFA': 0.001, 'Final_NH3': 0.001, 'CH4_Yield': 0.01 * s[0], 'Biogas_Flow': 1.0})
+            for s in scenarios]
+
+
+def scenarios():
+    # 30 distinct scenarios, then 5 of them again: every repeat lands in a later chunk
+    unique = [(30.0 + i, 35.0, 40.0, 1.0, 1.5, 0.2, 0.3, 6.0) for i in range(30)]
+    return unique + unique[:5]
+
+
+def test_merge_drops_duplicates_and_checks_completeness(tmp_path):
+    shards = []
+    for i in range(2):
+        root = str(tmp_path / f"shard{i}")
+        run_sweep(scenarios(), fake_chunk, root, workers=1, chunk_size=10, writer=PartWriter(root), shard=(i, 2))
+        shards.append(root)
+
+    with pytest.raises(ValueError, match="missing"):
+        merge_datasets(shards[:1], str(tmp_path / "partial"))
+    partial = merge_datasets(shards[:1], str(tmp_path / "partial"), allow_partial=True)
+    assert partial['missing'] == [1, 3]
+
+    stats = merge_datasets(shards, str(tmp_path / "merged" / "dataset"))
+    assert stats['chunks'] == 4 and stats['missing'] == []
+    assert stats['rows'] == 30 and stats['duplicates'] == 5
+    merged = load_dataset(str(tmp_path / "merged"))
+    assert len(merged) == 30 and merged['FlowRate'].nunique() == 30
+
+
+def test_part_temp_files_are_per_writer(tmp_path, monkeypatch):
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: (replaced.append(src), real_replace(src, dst)))
+    PartWriter(str(tmp_path)).write(fake_chunk(scenarios()[:4]), 0)
+    assert replaced and all(f"-{os.getpid()}.tmp" in os.path.basename(src) for src in replaced)
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")]
@@ -0,0 +1,142 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_generator import MODEL_VERSION
+from features import INPUT_COLUMNS
+
+
+# Full simulation time series for every scenario of a sweep, in one preallocated store:
+#   <dir>/trajectories.npy   float32 (n_scenarios, 2 stages, 10 states, n_points)
+#   <dir>/scenarios.npy      float64 (n_scenarios, 8) input table; the row number is the scenario id
+#   <dir>/status.npy         uint8 per scenario: 0 not yet written, 1 ok, 2 failed
+#   <dir>/meta.json          time axis, state names, horizon, model version
+# Sweep workers open the store memory-mapped and write their own rows in place, so no
+# trajectories pass back through the pool. Readers memory-map it too: slicing one scenario or
+# one state variable only touches those pages, never the whole (multi-GB for the full grid) file.
+
+STATE_NAMES = ['S_su', 'X_hyd', 'S_aa', 'X_aco', 'S_ac', 'X_ace', 'S_ch4', 'S_vfa', 'S_nh3', 'X_meth']
+STAGES = (1, 2)
+NOT_WRITTEN, OK, FAILED = 0, 1, 2
+
+# Stores already opened by this process (sweep workers reuse theirs across chunks)
+_open_stores = {}
+
+
+class TrajectoryStore:
+    def __init__(self, path, mode="r"):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.times = np.asarray(self.meta['times'])
+        self.data = np.load(os.path.join(path, "trajectories.npy"), mmap_mode=mode)
+        self.status = np.load(os.path.join(path, "status.npy"), mmap_mode=mode)
+        self.scenarios = np.load(os.path.join(path, "scenarios.npy"), mmap_mode="r")
+        self._ids = None
+
+    @classmethod
+    def create(cls, path, scenarios, hours=30, points=300):
+        """Preallocate a store for these scenarios, or reopen it if it already holds the same ones."""
+        scenarios = np.asarray(scenarios, dtype=np.float64)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            store = cls(path, mode="r+")
+            same = (store.meta['hours'] == hours and len(store.times) == points
+                    and store.meta['model_version'] == MODEL_VERSION and np.array_equal(store.scenarios, scenarios))
+            if not same:
+                raise ValueError(f"{path} holds trajectories for different scenarios or settings; use a fresh directory")
+            return store
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "scenarios.npy"), scenarios)
+        # open_memmap writes the header and sizes the file without filling it, so creation is instant
+        np.lib.format.open_memmap(os.path.join(path, "trajectories.npy"), mode="w+", dtype=np.float32,
+                                  shape=(len(scenarios), len(STAGES), len(STATE_NAMES), points)).flush()
+        np.lib.format.open_memmap(os.path.join(path, "status.npy"), mode="w+", dtype=np.uint8,
+                                  shape=(len(scenarios),)).flush()
+        meta = {
+            'model_version': MODEL_VERSION,
+            'hours': hours,
+            'times': np.linspace(0, hours, points).tolist(),
+            'states': STATE_NAMES,
+            'inputs': INPUT_COLUMNS,
+            'layout': ['scenario', 'stage', 'state', 'time'],
+        }
+        # meta.json last: its presence marks a complete store
+        tmp_path = os.path.join(path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, "meta.json"))
+        return cls(path, mode="r+")
+
+    def __len__(self):
+        return len(self.scenarios)
+
+    @property
+    def points(self):
+        return len(self.times)
+
+    def ids(self, scenarios):
+        if self._ids is None:
+            self._ids = {tuple(row): i for i, row in enumerate(self.scenarios.tolist())}
+        try:
+            return np.array([self._ids[tuple(map(float, s))] for s in scenarios], dtype=np.int64)
+        except KeyError as e:
+            raise KeyError(f"scenario {e.args[0]} is not in the trajectory store {self.path}") from None
+
+    def write(self, scenarios, results):
+        """Write each result's 'trajectory' into its scenario's row; results without one are marked failed."""
+        ids = self.ids(scenarios)
+        for i, result in zip(ids, results):
+            trajectory = result.get('trajectory')
+            if trajectory is not None and np.isfinite(result['CH4_Yield']):
+                self.data[i] = trajectory
+                self.status[i] = OK
+            else:
+                self.data[i] = np.nan
+                self.status[i] = FAILED
+        self.data.flush()
+        self.status.flush()
+
+    # Reading
+
+    def state_index(self, name):
+        return STATE_NAMES.index(name)
+
+    def scenario(self, i):
+        """One scenario as a DataFrame: Time_h plus a stage<k>_<state> column per stage and state."""
+        block = np.asarray(self.data[i])
+        columns = {'Time_h': self.times}
+        for s, stage in enumerate(STAGES):
+            for k, name in enumerate(STATE_NAMES):
+                columns[f"stage{stage}_{name}"] = block[s, k]
+        frame = pd.DataFrame(columns)
+        frame.attrs = {**dict(zip(INPUT_COLUMNS, self.scenarios[i].tolist())), 'status': int(self.status[i])}
+        return frame
+
+    def variable(self, name, stage=2, ids=None):
+        """(len(ids), n_points) time series of one state variable; all scenarios when ids is None."""
+        rows = slice(None) if ids is None else np.asarray(ids)
+        return np.asarray(self.data[rows, STAGES.index(stage), self.state_index(name)])
+
+    def select(self, **inputs):
+        # Scenario ids whose inputs equal the given values, e.g. select(FlowRate=90.0, Temp1=36.0)
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in inputs.items():
+            mask &= np.isclose(self.scenarios[:, INPUT_COLUMNS.index(name)], value)
+        return np.flatnonzero(mask)
+
+    def summary(self):
+        counts = np.bincount(np.asarray(self.status), minlength=3)
+        size_gb = os.path.getsize(os.path.join(self.path, "trajectories.npy")) / 1e9
+        return (f" Trajectory store {self.path}: {len(self)} scenarios x {self.points} points ({size_gb:.2f} GB), "
+                f"{counts[OK]} written, {counts[FAILED]} failed, {counts[NOT_WRITTEN]} pending")
+
+
+def open_store(path, mode="r+"):
+    # Cached per process so a sweep worker maps the store and builds the id lookup once
+    key = (os.path.abspath(path), mode)
+    if key not in _open_stores:
+        _open_stores[key] = TrajectoryStore(path, mode=mode)
+    return _open_stores[key]
@@ -0,0 +1,301 @@
+import argparse
+import csv
+import json
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from data_generator import (MODEL_VERSION, SCENARIO_BOUNDS, STIFF_METHODS, adm1_jacobian, initial_state,
+                            integrate_stage, params)
+from features import V_stage1, V_stage2, INPUT_COLUMNS
+
+
+# Streaming digital twin. simulate_two_stage_system solves every scenario from a fresh digester;
+# here both stages keep their 10-element ADM1 state between readings and each new reading only
+# advances the model over its own interval, warm-started from the last state. Only the very
+# first reading pays for a cold start (the same 30 h spin-up the generator uses).
+# The state is checkpointed as a small JSON file so a restart picks up where it stopped.
+# Readings are dicts of INPUT_COLUMNS plus an optional Timestamp (ISO) or Hours (interval length);
+# fields a reading leaves out keep their last value.
+
+checkpoint_path = r"C:\Users\viswa\Desktop\IITI\Digestor Project\importanceMODEL\data\twin_checkpoint.json"
+
+STATE_NAMES = ['S_su', 'X_hyd', 'S_aa', 'X_aco', 'S_ac', 'X_ace', 'S_ch4', 'S_vfa', 'S_nh3', 'X_meth']
+TWIN_COLUMNS = ['Timestamp', 'Time_h'] + INPUT_COLUMNS + ['CH4_Interval', 'Biogas_Flow', 'VFA', 'NH3', 'update_ms', 'error']
+SOURCES = ("standin", "csv", "socket")
+
+
+class DigitalTwin:
+    def __init__(self, method="LSODA", warmup_hours=30):
+        if method not in STIFF_METHODS:
+            raise ValueError(f"method must be one of {STIFF_METHODS}, got {method!r}")
+        self.method = method
+        self.warmup_hours = warmup_hours
+        self.stage1 = None
+        self.stage2 = None
+        self.inputs = {}
+        self.t_hours = 0.0
+        self.ticks = 0
+        self.ch4_total = 0.0
+        self.last_timestamp = None
+
+    @property
+    def started(self):
+        return self.stage1 is not None
+
+    def stage_args(self, stage, feed):
+        i = self.inputs
+        if stage == 1:
+            return params, i['FlowRate'], feed, V_stage1, i['Temp1'] + 273.15, i['Agitator1_kW'], i['Recycle_Ratio']
+        return params, i['FlowRate'], feed, V_stage2, i['Temp2'] + 273.15, i['Agitator2_kW'], i['Recycle_Ratio']
+
+    def sugar_feed(self):
+        return self.inputs['SugarIn'] * (1 - self.inputs['PalmFrac'])
+
+    def cold_start(self):
+        # Same spin-up as simulate_two_stage_system: stage 2 is seeded with stage 1's outlet
+        self.stage1 = integrate_stage(initial_state(self.sugar_feed()), self.stage_args(1, self.sugar_feed()),
+                                      self.warmup_hours, self.method, adm1_jacobian)[0]
+        self.stage2 = integrate_stage(self.stage1, self.stage_args(2, self.stage1[0]),
+                                      self.warmup_hours, self.method, adm1_jacobian)[0]
+
+    def interval(self, reading, default_hours):
+        if reading.get('Hours') is not None:
+            return float(reading['Hours'])
+        timestamp = reading.get('Timestamp')
+        if timestamp is None or self.last_timestamp is None:
+            return default_hours
+        return (datetime.fromisoformat(timestamp) - datetime.fromisoformat(self.last_timestamp)).total_seconds() / 3600
+
+    def update(self, reading, default_hours=1.0):
+        """Advance both stages over one reading's interval and return the twin's outputs for it."""
+        self.inputs.update({k: float(reading[k]) for k in INPUT_COLUMNS if reading.get(k) is not None})
+        missing = [k for k in INPUT_COLUMNS if k not in self.inputs]
+        if missing:
+            raise ValueError(f"first reading is missing inputs: {missing}")
+        hours = self.interval(reading, default_hours)
+        if reading.get('Timestamp') is not None:
+            self.last_timestamp = reading['Timestamp']
+
+        if not self.started:
+            self.cold_start()
+        start = time.perf_counter()
+        record = {'Timestamp': reading.get('Timestamp', ''), **self.inputs, 'error': ''}
+        try:
+            if hours <= 0:
+                raise ValueError(f"interval must be positive, got {hours} h")
+            # S_ch4 never feeds back into the rates, so zero it and read off this interval's methane
+            stage1 = np.array(self.stage1)
+            stage2 = np.array(self.stage2)
+            stage1[6] = stage2[6] = 0.0
+            stage1 = integrate_stage(stage1, self.stage_args(1, self.sugar_feed()), hours, self.method, adm1_jacobian)[0]
+            stage2 = integrate_stage(stage2, self.stage_args(2, stage1[0]), hours, self.method, adm1_jacobian)[0]
+        except Exception as e:
+            # Keep the last good state; the next reading tries again from it
+            record.update({'CH4_Interval': np.nan, 'Biogas_Flow': np.nan, 'VFA': np.nan, 'NH3': np.nan,
+                           'error': f"{type(e).__name__}: {e}"})
+        else:
+            self.stage1, self.stage2 = stage1, stage2
+            ch4 = stage1[6] + stage2[6]
+            self.ch4_total += ch4
+            record.update({
+                'CH4_Interval': ch4,
+                'Biogas_Flow': ch4 * (self.inputs['FlowRate'] / 1000) * 0.65 / (hours / 24),
+                'VFA': stage2[7],
+                'NH3': stage2[8],
+            })
+        self.t_hours += max(hours, 0.0)
+        self.ticks += 1
+        record['Time_h'] = self.t_hours
+        record['update_ms'] = (time.perf_counter() - start) * 1000
+        return record
+
+    # Checkpoints
+
+    def save(self, path):
+        state = {
+            'model_version': MODEL_VERSION,
+            'method': self.method,
+            't_hours': self.t_hours,
+            'ticks': self.ticks,
+            'ch4_total': self.ch4_total,
+            'last_timestamp': self.last_timestamp,
+            'inputs': self.inputs,
+            'stage1': None if self.stage1 is None else dict(zip(STATE_NAMES, map(float, self.stage1))),
+            'stage2': None if self.stage2 is None else dict(zip(STATE_NAMES, map(float, self.stage2))),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, warmup_hours=30, method=None):
+        # method overrides the checkpointed solver; the ADM1 state itself does not depend on it
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state['model_version'] != MODEL_VERSION:
+            raise ValueError(f"checkpoint was written by model {state['model_version']!r}, this is {MODEL_VERSION!r}")
+        twin = cls(method=method or state['method'], warmup_hours=warmup_hours)
+        twin.t_hours = state['t_hours']
+        twin.ticks = state['ticks']
+        twin.ch4_total = state['ch4_total']
+        twin.last_timestamp = state['last_timestamp']
+        twin.inputs = state['inputs']
+        if state['stage1'] is not None:
+            twin.stage1 = np.array([state['stage1'][n] for n in STATE_NAMES])
+            twin.stage2 = np.array([state['stage2'][n] for n in STATE_NAMES])
+        return twin
+
+
+# Feeds: each yields one reading dict at a time
+
+def parse_reading(row):
+    reading = {}
+    for key, value in row.items():
+        if value is None or value == "":
+            continue
+        reading[key] = value if key == 'Timestamp' else float(value)
+    return reading
+
+
+def csv_tail(path, follow=True, poll_s=0.5):
+    # Like `tail -f`: a line is only parsed once its newline has been written
+    with open(path, newline="", encoding="utf-8") as f:
+        header, pending = None, ""
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    if not pending.strip():
+                        return
+                    line = "\n"
+                else:
+                    time.sleep(poll_s)
+                    continue
+            pending += line
+            if not pending.endswith("\n"):
+                continue
+            fields, pending = next(csv.reader([pending])), ""
+            if not fields:
+                continue
+            if header is None:
+                header = fields
+                continue
+            yield parse_reading(dict(zip(header, fields)))
+
+
+def socket_feed(port, host="127.0.0.1"):
+    # One NDJSON reading per line; clients may connect, send and disconnect repeatedly
+    with socket.create_server((host, port)) as server:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile("r", encoding="utf-8") as stream:
+                for line in stream:
+                    if line.strip():
+                        yield parse_reading(json.loads(line))
+
+
+def stand_in_feed(ticks=None, interval_hours=1.0, seed=42, start="2024-01-01T00:00:00", initial=None, step=0.02):
+    # Local stand-in for plant sensors: a bounded random walk over the scenario ranges
+    rng = np.random.default_rng(seed)
+    lower = np.array([SCENARIO_BOUNDS[k][0] for k in INPUT_COLUMNS], dtype=float)
+    upper = np.array([SCENARIO_BOUNDS[k][1] for k in INPUT_COLUMNS], dtype=float)
+    x = np.array([initial[k] for k in INPUT_COLUMNS]) if initial else (lower + upper) / 2
+    clock = datetime.fromisoformat(start)
+    i = 0
+    while ticks is None or i < ticks:
+        yield {'Timestamp': clock.isoformat(), **dict(zip(INPUT_COLUMNS, map(float, x)))}
+        x = np.clip(x + rng.normal(0.0, step, len(x)) * (upper - lower), lower, upper)
+        clock += timedelta(hours=interval_hours)
+        i += 1
+
+
+def run(twin, feed, interval_hours=1.0, checkpoint=None, checkpoint_every=10, output=None, max_ticks=None, quiet=False):
+    writer = out = None
+    if output:
+        new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+        out = open(output, "a", newline="", encoding="utf-8")
+        writer = csv.DictWriter(out, fieldnames=TWIN_COLUMNS)
+        if new_file:
+            writer.writeheader()
+
+    update_ms, skipped, done = [], 0, 0
+    try:
+        for reading in feed:
+            # After a restart, readings the checkpoint already covers are skipped rather than replayed
+            if (twin.last_timestamp is not None and reading.get('Timestamp') is not None
+                    and datetime.fromisoformat(reading['Timestamp']) <= datetime.fromisoformat(twin.last_timestamp)):
+                skipped += 1
+                continue
+            record = twin.update(reading, interval_hours)
+            update_ms.append(record['update_ms'])
+            done += 1
+            if writer:
+                writer.writerow(record)
+                out.flush()
+            if not quiet:
+                status = record['error'] or (f"CH4 {record['CH4_Interval']:.4g}  biogas {record['Biogas_Flow']:.4g}  "
+                                             f"VFA {record['VFA']:.4g}  NH3 {record['NH3']:.4g}")
+                print(f" t={record['Time_h']:8.2f}h  {status}  ({record['update_ms']:.2f} ms)")
+            if checkpoint and twin.ticks % checkpoint_every == 0:
+                twin.save(checkpoint)
+            if max_ticks is not None and done >= max_ticks:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if checkpoint and twin.started:
+            twin.save(checkpoint)
+        if out:
+            out.close()
+
+    if update_ms:
+        ms = np.array(update_ms)
+        print(f" {len(ms)} updates ({skipped} already checkpointed): median {np.median(ms):.2f} ms, "
+              f"p99 {np.percentile(ms, 99):.2f} ms, max {ms.max():.2f} ms")
+    return twin
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the two-stage ADM1 model as a streaming digital twin")
+    parser.add_argument("--source", choices=SOURCES, default="standin")
+    parser.add_argument("--path", default=None, help="CSV file to tail (--source csv)")
+    parser.add_argument("--no-follow", action="store_true", help="stop at the end of the CSV instead of waiting for rows")
+    parser.add_argument("--host", default="127.0.0.1")
+    # Not prediction_server.py's 8765, so both can run side by side with their defaults
+    parser.add_argument("--port", type=int, default=8766, help="port to listen on for NDJSON readings (--source socket)")
+    parser.add_argument("--interval-hours", type=float, default=1.0,
+                        help="interval used when readings carry neither Timestamp nor Hours")
+    parser.add_argument("--ticks", type=int, default=None, help="stop after this many updates")
+    parser.add_argument("--checkpoint", default=checkpoint_path)
+    parser.add_argument("--checkpoint-every", type=int, default=10)
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint and cold-start")
+    parser.add_argument("--method", choices=STIFF_METHODS, default=None,
+                        help="stiff solver (default: the checkpoint's on resume, else LSODA)")
+    parser.add_argument("--warmup-hours", type=float, default=30)
+    parser.add_argument("--output", default=None, help="append one row per update to this CSV")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    if args.source == "csv" and not args.path:
+        parser.error("--source csv needs --path")
+
+    if not args.fresh and os.path.exists(args.checkpoint):
+        twin = DigitalTwin.load(args.checkpoint, warmup_hours=args.warmup_hours, method=args.method)
+        print(f" Resumed from {args.checkpoint}: t={twin.t_hours:.2f}h after {twin.ticks} updates, {twin.method} solver")
+    else:
+        twin = DigitalTwin(method=args.method or "LSODA", warmup_hours=args.warmup_hours)
+
+    if args.source == "csv":
+        feed = csv_tail(args.path, follow=not args.no_follow)
+    elif args.source == "socket":
+        feed = socket_feed(args.port, args.host)
+    else:
+        # After a resume, continue the stand-in walk from the checkpointed clock and inputs
+        resume = {'start': twin.last_timestamp, 'initial': twin.inputs, 'seed': twin.ticks} if twin.last_timestamp else {}
+        feed = stand_in_feed(interval_hours=args.interval_hours, **resume)
+    run(twin, feed, args.interval_hours, args.checkpoint, args.checkpoint_every, args.output, args.ticks, args.quiet)
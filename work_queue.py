@@ -0,0 +1,57 @@
+import os
+import socket
+import sqlite3
+import time
+
+
+# SQLite-backed chunk queue for spreading one sweep over several hosts.
+# Every host points at the same queue file on a shared filesystem (which must support
+# POSIX locks) and pulls chunk indices until none are left. A chunk whose claim is older
+# than the lease is handed out again, so a host that dies mid-chunk does not stall the sweep.
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=3600):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.conn = sqlite3.connect(path, timeout=120, isolation_level=None)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "idx INTEGER PRIMARY KEY, status TEXT NOT NULL DEFAULT 'pending', "
+            "owner TEXT, claimed_at REAL)"
+        )
+
+    def populate(self, indices):
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany("INSERT OR IGNORE INTO chunks (idx) VALUES (?)", [(int(i),) for i in indices])
+        self.conn.execute("COMMIT")
+
+    def claim(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two hosts never claim the same chunk
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT idx FROM chunks WHERE status = 'pending' "
+                "OR (status = 'running' AND claimed_at < ?) ORDER BY idx LIMIT 1",
+                (now - self.lease_seconds,)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE chunks SET status = 'running', owner = ?, claimed_at = ? WHERE idx = ?",
+                    (self.owner, now, row[0])
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return None if row is None else row[0]
+
+    def complete(self, index):
+        self.conn.execute("UPDATE chunks SET status = 'done' WHERE idx = ?", (int(index),))
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM chunks GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()